@@ -13,6 +13,7 @@ import argparse
 import multiprocessing
 from warnings import filterwarnings
 
+import psutil
 import pygame
 from gpiozero import Device, ButtonBoard, LEDBoard, pi_info
 from gpiozero.exc import BadPinFactory, PinFactoryFallback
@@ -20,13 +21,15 @@ from gpiozero.exc import BadPinFactory, PinFactoryFallback
 import pibooth
 from pibooth import fonts
 from pibooth import language
+from pibooth import pictures
 from pibooth.counters import Counters
-from pibooth.utils import (LOGGER, PoolingTimer, configure_logging, get_crash_message,
+from pibooth.utils import (LOGGER, PoolingTimer, StepTimer, configure_logging, get_crash_message,
                            set_logging_level, get_event_pos)
 from pibooth.states import StateMachine
+from pibooth.scheduler import FrameScheduler
 from pibooth.plugins import create_plugin_manager
 from pibooth.view import PiWindow
-from pibooth.config import PiConfigParser, PiConfigMenu
+from pibooth.config import PiConfigParser
 from pibooth.printer import PRINTER_TASKS_UPDATED, Printer
 
 
@@ -75,6 +78,8 @@ class PiApplication(object):
     def __init__(self, config, plugin_manager):
         self._pm = plugin_manager
         self._config = config
+        self._startup = StepTimer(psutil.Process().create_time())
+        self._startup.step('imports and configuration')
 
         # Create directories where pictures are saved
         for savedir in config.gettuple('GENERAL', 'directory', 'path'):
@@ -100,6 +105,8 @@ class PiApplication(object):
             self._window = PiWindow(title, orientation=init_orientation, color=init_color,
                                     text_color=init_text_color, debug=init_debug)
 
+        self._startup.step('window')
+
         self._orientation = init_orientation
         self._menu = None
         self._multipress_timer = PoolingTimer(config.getfloat('CONTROLS', 'multi_press_delay'), False)
@@ -116,6 +123,9 @@ class PiApplication(object):
         self._machine.add_state('print')
         self._machine.add_state('finish')
 
+        # Pace the main loop, the statistics per state are available for plugins
+        self.scheduler = FrameScheduler()
+
         # ---------------------------------------------------------------------
         # Variables shared with plugins
         # Change them may break plugins compatibility
@@ -126,11 +136,12 @@ class PiApplication(object):
         self.previous_animated = None
         self.previous_picture_file = None
 
-        self.count = Counters(self._config.join_path("counters.pickle"),
+        self.count = Counters(self._config.join_path("counters.db"),
                               taken=0, printed=0, forgotten=0,
                               remaining_duplicates=self._config.getint('PRINTER', 'max_duplicates'))
 
         self.camera = self._pm.hook.pibooth_setup_camera(cfg=self._config)
+        self._startup.step('camera')
 
         self.buttons = ButtonBoard(capture="BOARD" + config.get('CONTROLS', 'picture_btn_pin'),
                                    printer="BOARD" + config.get('CONTROLS', 'print_btn_pin'),
@@ -142,10 +153,11 @@ class PiApplication(object):
         self.leds = LEDBoard(capture="BOARD" + config.get('CONTROLS', 'picture_led_pin'),
                              printer="BOARD" + config.get('CONTROLS', 'print_led_pin'))
 
-        self.printer = Printer(config.get('PRINTER', 'printer_name'),
+        self.printer = Printer(config.gettuple('PRINTER', 'printer_name', str),
                                config.getint('PRINTER', 'max_pages'),
                                config.gettyped('PRINTER', 'printer_options'),
                                self.count)
+        self._startup.step('buttons and printer')
         # ---------------------------------------------------------------------
 
     def _initialize(self):
@@ -198,8 +210,15 @@ class PiApplication(object):
             set_logging_level(logging.DEBUG)
             self._machine.remove_state('failsafe')
 
+        # Handle the plugins time budget
+        self._pm.set_hook_budget(self._config.getfloat('GENERAL', 'plugins_budget'),
+                                 self._config.getboolean('GENERAL', 'plugins_budget_disable'))
+
         # Reset the print counter (in case of max_pages is reached)
         self.printer.max_pages = self._config.getint('PRINTER', 'max_pages')
+        self.printer.native = self._config.getboolean('PRINTER', 'native_resolution')
+        self.printer.routing = self._config.get('PRINTER', 'printer_routing')
+        self.printer.batch_delay = self._config.getfloat('PRINTER', 'batch_delay')
 
     def _on_button_capture_held(self):
         """Called when the capture button is pressed.
@@ -386,14 +405,18 @@ class PiApplication(object):
 
     def main_loop(self):
         try:
-            fps = 40
-            clock = pygame.time.Clock()
             self._initialize()
             self._pm.hook.pibooth_startup(cfg=self._config, app=self)
+            self._startup.step('plugins startup')
             self._machine.set_state('wait')
+            self._window.update_display()
+            self._startup.step('first frame')
+            LOGGER.info("Startup timings: %s", self._startup.report())
+            for name, duration in self._startup.steps:
+                self._pm.profiler.add('startup', name, duration)
 
             while True:
-                events = list(pygame.event.get())
+                events = self.scheduler.get_events()
 
                 if self.find_quit_event(events):
                     break
@@ -408,6 +431,7 @@ class PiApplication(object):
                 if not self._menu and self.find_settings_event(events):
                     self.camera.stop_preview()
                     self.leds.off()
+                    from pibooth.config.menu import PiConfigMenu  # Slow to import, only when used
                     self._menu = PiConfigMenu(self._pm, self._config, self, self._window)
                     self._menu.show()
                     self.leds.blink(on_time=0.1, off_time=1)
@@ -421,14 +445,18 @@ class PiApplication(object):
                 else:
                     self._machine.process(events)
 
-                pygame.display.update()
-                clock.tick(fps)  # Ensure the program will never run at more than <fps> frames per second
+                # The menu paints directly on the window surface
+                self._window.update_display(full=self._menu is not None)
+                # Never run at more than <fps> frames per second, less when idle
+                self.scheduler.tick('menu' if self._menu else self._machine.active_state)
 
         except Exception as ex:
             LOGGER.error(str(ex), exc_info=True)
             LOGGER.error(get_crash_message())
         finally:
             self._pm.hook.pibooth_cleanup(app=self)
+            self._pm.profiler.log()
+            self.count.close()
             pygame.quit()
 
 
@@ -493,6 +521,9 @@ def main():
     # Load the languages
     language.init(config.join_path("translations.cfg"), options.reset)
 
+    # Keep the rasterized images between restarts
+    pictures.CACHE_DIR = config.join_path("cache")
+
     # Update configuration with plugins ones
     plugin_manager.hook.pibooth_configure(cfg=config)
 
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from collections import OrderedDict
+from concurrent import futures
 from pibooth.utils import LOGGER
 from pibooth.camera.rpi import RpiCamera, get_rpi_camera_proxy
 from pibooth.camera.gphoto import GpCamera, get_gp_camera_proxy
@@ -7,6 +9,28 @@ from pibooth.camera.opencv import CvCamera, get_cv_camera_proxy
 from pibooth.camera.hybrid import HybridRpiCamera, HybridCvCamera
 
 
+# Functions used to detect each type of camera
+PROXIES = OrderedDict([('rpi', get_rpi_camera_proxy),
+                       ('gphoto', get_gp_camera_proxy),
+                       ('opencv', get_cv_camera_proxy)])
+
+# Cameras by priority order with the types of camera they require. The
+# priority order is chosen in order to have best rendering during preview
+# and to take captures.
+CAMERAS = OrderedDict([(HybridRpiCamera, ('rpi', 'gphoto')),
+                       (HybridCvCamera, ('opencv', 'gphoto')),
+                       (GpCamera, ('gphoto',)),
+                       (RpiCamera, ('rpi',)),
+                       (CvCamera, ('opencv',))])
+
+# Dedicated gPhoto2 camera: the shutter is triggered by the booth
+# controller, other cameras are neither probed nor used
+DEDICATED_CAMERA = GpCamera
+
+# Maximum time to detect a camera in seconds
+PROBE_TIMEOUT = 10
+
+
 def close_proxy(rpi_cam_proxy, gp_cam_proxy, cv_cam_proxy):
     """Close proxy drivers.
     """
@@ -18,38 +42,81 @@ def close_proxy(rpi_cam_proxy, gp_cam_proxy, cv_cam_proxy):
         CvCamera(cv_cam_proxy).quit()
 
 
-def find_camera():
+def _close_proxies(proxies):
+    """Close the proxies given by type of camera.
+    """
+    close_proxy(proxies.get('rpi'), proxies.get('gphoto'), proxies.get('opencv'))
+
+
+def _close_late_proxy(name, task):
+    """Close a proxy found after the probe timeout.
+    """
+    if not task.cancelled() and not task.exception() and task.result():
+        LOGGER.warning("Camera '%s' found after timeout, close it", name)
+        _close_proxies({name: task.result()})
+
+
+def probe_cameras(names, timeout=PROBE_TIMEOUT):
+    """Detect the given types of camera in parallel. Return a dictionary
+    with the proxy of each type of camera found.
+
+    :param names: types of camera to detect (keys of :py:data:`PROXIES`)
+    :type names: list
+    :param timeout: maximum time to detect the cameras in seconds
+    :type timeout: float
+    """
+    executor = futures.ThreadPoolExecutor(len(names), thread_name_prefix='CameraProbe')
+    tasks = OrderedDict((name, executor.submit(PROXIES[name])) for name in names)
+    done, _ = futures.wait(tasks.values(), timeout)
+    executor.shutdown(wait=False)
+
+    proxies = {}
+    for name, task in tasks.items():
+        if task in done:
+            try:
+                proxy = task.result()
+            except Exception:
+                _close_proxies(proxies)
+                raise
+            if proxy:
+                proxies[name] = proxy
+        else:
+            LOGGER.warning("Camera '%s' not detected after %s seconds", name, timeout)
+            task.add_done_callback(lambda task, name=name: _close_late_proxy(name, task))
+    return proxies
+
+
+def find_camera(last_camera=None):
     """Initialize the camera depending of the connected one. The priority order
     is chosen in order to have best rendering during preview and to take captures.
     The gPhoto2 camera is first (drivers most restrictive) to avoid connection
     concurence in case of DSLR compatible with OpenCV.
+
+    :param last_camera: name of the camera class found at last startup, its
+                        cameras are detected first to avoid probing the others
+    :type last_camera: str
     """
-    rpi_cam_proxy = get_rpi_camera_proxy()
-    gp_cam_proxy = get_gp_camera_proxy()
-    cv_cam_proxy = get_cv_camera_proxy()
-
-    # dedicated gphoto2 camera for testing
-    return GpCamera(gp_cam_proxy)
-
-    if rpi_cam_proxy and gp_cam_proxy:
-        LOGGER.info("Configuring hybrid camera (Picamera + gPhoto2) ...")
-        close_proxy(None, None, cv_cam_proxy)
-        return HybridRpiCamera(rpi_cam_proxy, gp_cam_proxy)
-    elif cv_cam_proxy and gp_cam_proxy:
-        LOGGER.info("Configuring hybrid camera (OpenCV + gPhoto2) ...")
-        close_proxy(rpi_cam_proxy, None, None)
-        return HybridCvCamera(cv_cam_proxy, gp_cam_proxy)
-    elif gp_cam_proxy:
-        LOGGER.info("Configuring gPhoto2 camera ...")
-        close_proxy(rpi_cam_proxy, None, cv_cam_proxy)
-        return GpCamera(gp_cam_proxy)
-    elif rpi_cam_proxy:
-        LOGGER.info("Configuring Picamera camera ...")
-        close_proxy(None, gp_cam_proxy, cv_cam_proxy)
-        return RpiCamera(rpi_cam_proxy)
-    elif cv_cam_proxy:
-        LOGGER.info("Configuring OpenCV camera ...")
-        close_proxy(rpi_cam_proxy, gp_cam_proxy, None)
-        return CvCamera(cv_cam_proxy)
+    if DEDICATED_CAMERA:
+        names = CAMERAS[DEDICATED_CAMERA]
+        proxies = probe_cameras(names)
+        if len(proxies) != len(names):
+            LOGGER.warning("No camera detected for dedicated '%s'", DEDICATED_CAMERA.__name__)
+        return DEDICATED_CAMERA(*[proxies.get(name) for name in names])
+
+    for cls, names in CAMERAS.items():
+        if cls.__name__ == last_camera:
+            proxies = probe_cameras(names)
+            if len(proxies) == len(names):
+                LOGGER.info("Configuring last used camera (%s) ...", cls.__name__)
+                return cls(*[proxies[name] for name in names])
+            _close_proxies(proxies)
+            break
+
+    proxies = probe_cameras(list(PROXIES))
+    for cls, names in CAMERAS.items():
+        if all(name in proxies for name in names):
+            LOGGER.info("Configuring %s camera ...", cls.__name__)
+            _close_proxies(dict((name, proxy) for name, proxy in proxies.items() if name not in names))
+            return cls(*[proxies[name] for name in names])
 
     raise EnvironmentError("Neither Raspberry Pi nor GPhoto2 nor OpenCV camera detected")
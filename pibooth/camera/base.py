@@ -4,10 +4,58 @@ import pygame
 from PIL import Image, ImageDraw
 
 from pibooth import fonts
+from pibooth import language
 from pibooth.pictures import sizing
 from pibooth.utils import LOGGER, PoolingTimer, pkill
 
 
+class CountdownAtlas(object):
+
+    """Sprites of the countdown texts. They are rendered only once per
+    configuration (size, font, language and render options).
+
+    :param render: function called with (size, text, *options) to render a sprite
+    :type render: callable
+    """
+
+    def __init__(self, render):
+        self._render = render
+        self._key = None
+        self._sprites = {}
+
+    def prepare(self, size, texts, *options):
+        """Render the sprites of the given texts if not already done.
+        All sprites are dropped if the configuration has changed.
+
+        :param size: size of the sprites
+        :type size: tuple
+        :param texts: texts to render
+        :type texts: list
+        :param options: options passed to the render function
+
+        :return: True if the sprites have been dropped
+        :rtype: bool
+        """
+        key = (tuple(size), fonts.CURRENT, language.CURRENT, options)
+        invalidated = key != self._key
+        if invalidated:
+            LOGGER.debug("Render countdown sprites of size %s", size)
+            self._key = key
+            self._sprites = {}
+        for text in texts:
+            self.get(text)
+        return invalidated
+
+    def get(self, text):
+        """Return the sprite of the given text, render it if necessary.
+        """
+        text = str(text)
+        if text not in self._sprites:
+            size, _, _, options = self._key
+            self._sprites[text] = self._render(size, text, *options)
+        return self._sprites[text]
+
+
 class BaseCamera(object):
 
     def __init__(self, camera_proxy):
@@ -16,15 +64,20 @@ class BaseCamera(object):
         self._window = None
         self._overlay = None
         self._captures = []
+        self._countdown = CountdownAtlas(self._build_countdown_sprite)
 
         self.resolution = None
         self.delete_internal_memory = False
+        self.raw_passthrough = False
+        self.slot_size = None
         self.preview_rotation, self.capture_rotation = (0, 0)
         self.preview_iso, self.capture_iso = (100, 800)
         self.imageformat = 'Large Normal JPEG'
+        self.captures_folders = ('/store_00020001/DCIM/100CANON',)
         self.preview_flip, self.capture_flip = (False, False)
 
-    def initialize(self, iso, resolution, rotation=0, flip=False, delete_internal_memory=False, imageformat=None):
+    def initialize(self, iso, resolution, rotation=0, flip=False, delete_internal_memory=False, imageformat=None,
+                   raw_passthrough=False, captures_folders=None):
         """Initialize the camera.
         """
         if not isinstance(rotation, (tuple, list)):
@@ -42,7 +95,10 @@ class BaseCamera(object):
         self.preview_iso, self.capture_iso = iso
         if imageformat:
             self.imageformat = imageformat
+        if captures_folders:
+            self.captures_folders = tuple(folder.rstrip('/') for folder in captures_folders)
         self.delete_internal_memory = delete_internal_memory
+        self.raw_passthrough = raw_passthrough
         self._specific_initialization()
 
     def _specific_initialization(self):
@@ -71,6 +127,36 @@ class BaseCamera(object):
         """
         raise NotImplementedError
 
+    def set_slot_size(self, size):
+        """Set the maximum size at which the captures are pasted in the final
+        picture. Cameras may use it to decode smaller captures when the raw
+        captures are not built from the returned images.
+
+        :param size: (width, height) of the biggest slot
+        :type size: tuple
+        """
+        self.slot_size = size
+
+    def _get_countdown_size(self):
+        """Return the size of the countdown sprites.
+        """
+        rect = self.get_countdown_rect()
+        return (rect.width, rect.height)
+
+    def _build_countdown_sprite(self, size, text, *options):
+        """Return the countdown sprite of the given text (a pygame surface
+        displayed above the preview).
+        """
+        image = self.build_countdown_top(size, text)
+        return pygame.image.frombuffer(image.tobytes(), image.size, image.mode)
+
+    def _prepare_countdown(self, timeout, *options):
+        """Render the sprites of a countdown of `timeout` seconds before
+        starting it.
+        """
+        texts = [str(i) for i in range(1, int(timeout) + 1)] + [language.get_translated_text('smile')]
+        return self._countdown.prepare(self._get_countdown_size(), texts, *options)
+
     def get_rect(self, max_size=None):
         """Return a Rect object (as defined in pygame) for resizing preview and images
         in order to fit to the defined window.
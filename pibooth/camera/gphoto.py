@@ -1,23 +1,27 @@
 # -*- coding: utf-8 -*-
 
 import io
+import math
 import time
+import threading
+from collections import deque
+from concurrent import futures
 import pygame
 try:
     import gphoto2 as gp
 except ImportError:
     gp = None  # gphoto2 is optional
 from PIL import Image, ImageFilter
-from pibooth.pictures import sizing
+from pibooth.pictures import sizing, exif
 from pibooth.utils import LOGGER, PoolingTimer, pkill
 from pibooth.language import get_translated_text
 from pibooth.camera.base import BaseCamera
+from pibooth.camera.preview import PreviewPipeline
 
 import subprocess as sp
 import serial
 
 
-
 class TKimg():
     folder = None
     name = None
@@ -91,11 +95,24 @@ class GpCamera(BaseCamera):
                      u'smooth_more',
                      u'sharpen']
 
+    # Maximum time to wait for a capture file on the camera (in seconds)
+    CAPTURE_TIMEOUT = 10
+    # Time to wait for a FILE_ADDED event before listing the folders (in seconds)
+    EVENT_TIMEOUT = 3
+
     def __init__(self, camera_proxy):
         super(GpCamera, self).__init__(camera_proxy)
         self._gp_logcb = None
         self._preview_compatible = True
         self._preview_viewfinder = False
+        self._lock = threading.RLock()  # gPhoto2 camera access is not thread safe
+        self._downloader = futures.ThreadPoolExecutor(max_workers=1)
+        self._downloads = []
+        self._known_files = set()  # Index of (folder, name) already on the camera
+        self._new_files = deque()  # Files not yet downloaded
+        self._preview_size = None
+        self._preview_transform = (None, None)
+        self._preview_pipeline = PreviewPipeline(self._grab_preview, self._process_preview)
 
         req = sp.run("ls /dev | grep USB", shell=True, capture_output=True)
 
@@ -127,6 +144,9 @@ class GpCamera(BaseCamera):
         self.set_config_value('settings', 'capturetarget', 'Memory card')
         self.set_config_value('imgsettings', 'imageformat', self.imageformat)
         self.set_config_value('imgsettings', 'imageformatsd', self.imageformat)
+        with self._lock:
+            self._known_files = set(self._list_captures_files())
+        LOGGER.debug("%s files indexed in camera folders %s", len(self._known_files), self.captures_folders)
 
     def _show_overlay(self, text, alpha):
         """Add an image as an overlay.
@@ -138,11 +158,8 @@ class GpCamera(BaseCamera):
             # self._overlay = self.build_countdown_top((rect.width, rect.height), str(text), alpha)
             # self._overlay = self.build_overlay((rect.width, rect.height), str(text), alpha)
 
-            ct_rect = self.get_countdown_rect()
-            ct_pil_image = self.build_countdown_top((ct_rect.width, ct_rect.height), str(text))
-            LOGGER.debug("created countdown image to display")
-            #ct_pil_image.save("countdown_img"+text+".png")
-            updated = self._window.show_image(ct_pil_image, pos='top')
+            self._countdown.prepare(self._get_countdown_size(), ())
+            updated = self._window.show_image(self._countdown.get(text), pos='top')
 
             pygame.event.pump()
             if updated:
@@ -159,27 +176,91 @@ class GpCamera(BaseCamera):
             return image.transpose(Image.ROTATE_270)
         return image
 
-    def _get_preview_image(self):
-        """Capture a new preview image.
+    def _grab_preview(self):
+        """Grab a new preview frame from the camera.
+
+        :return: JPEG data
+        :rtype: bytes
         """
-        rect = self.get_rect()
-        if self._preview_compatible:
+        with self._lock:
             cam_file = self._cam.capture_preview()
-            image = Image.open(io.BytesIO(cam_file.get_data_and_size()))
-            image = self._rotate_image(image, self.preview_rotation)
-            # Crop to keep aspect ratio of the resolution
-            image = image.crop(sizing.new_size_by_croping_ratio(image.size, self.resolution))
-            # Resize to fit the available space in the window
-            image = image.resize(sizing.new_size_keep_aspect_ratio(image.size, (rect.width, rect.height), 'outer'))
+        return bytes(cam_file.get_data_and_size())
 
+    def _get_preview_transform(self, size):
+        """Return the output size and the affine coefficients which rotate,
+        crop (to keep aspect ratio of the resolution), resize (to fit the
+        preview size) and flip a frame of the given size in one pass. They
+        are computed again only if the configuration has changed.
+        """
+        key = (size, self.preview_rotation, self.preview_flip, tuple(self.resolution), self._preview_size)
+        if self._preview_transform[0] != key:
+            width, height = size
+            if self.preview_rotation in (90, 270):
+                rotated = (height, width)
+            else:
+                rotated = size
+            x1, y1, x2, y2 = sizing.new_size_by_croping_ratio(rotated, self.resolution)
+            out_size = sizing.new_size_keep_aspect_ratio((x2 - x1, y2 - y1), self._preview_size, 'outer')
+            scale_x, scale_y = (x2 - x1) / float(out_size[0]), (y2 - y1) / float(out_size[1])
+            # Output pixel to rotated frame pixel: X = ax * x + cx, Y = scale_y * y + y1
             if self.preview_flip:
-                image = image.transpose(Image.FLIP_LEFT_RIGHT)
-        else:
-            image = Image.new('RGB', (rect.width, rect.height), color=(0, 0, 0))
+                ax, cx = -scale_x, x1 + scale_x * out_size[0]
+            else:
+                ax, cx = scale_x, x1
+            # Rotated frame pixel to source pixel (rotation counter-clockwise as PIL)
+            coeffs = {0: (ax, 0, cx, 0, scale_y, y1),
+                      90: (0, -scale_y, width - y1, ax, 0, cx),
+                      180: (-ax, 0, width - cx, 0, -scale_y, height - y1),
+                      270: (0, scale_y, y1, -ax, 0, height - cx)}[self.preview_rotation]
+            self._preview_transform = (key, (out_size, coeffs))
+        return self._preview_transform[1]
+
+    def _process_preview(self, data):
+        """Decode and transform a preview frame to a pygame surface ready
+        to be displayed.
+        """
+        image = Image.open(io.BytesIO(data))
+        size, coeffs = self._get_preview_transform(image.size)
+        image = image.transform(size, Image.AFFINE, coeffs, Image.BILINEAR)
 
         if self._overlay:
             image.paste(self._overlay, (0, 0), self._overlay)
-        return image
+        return pygame.image.frombuffer(image.tobytes(), image.size, image.mode)
+
+    def _get_preview_image(self, timeout=None):
+        """Return a new preview image, produced by the preview pipeline if
+        running. Return None if no new frame is available before the timeout.
+        """
+        if not self._preview_compatible:
+            image = Image.new('RGB', self._preview_size, color=(0, 0, 0))
+            if self._overlay:
+                image.paste(self._overlay, (0, 0), self._overlay)
+            return image
+        if self._preview_pipeline.is_running():
+            return self._preview_pipeline.get_frame(timeout)
+        return self._process_preview(self._grab_preview())
+
+    def _get_capture_size(self):
+        """Return the size of the processed captures: the configured resolution,
+        reduced to the slot size when the raw captures are the camera files.
+        """
+        if self.raw_passthrough and self.slot_size:
+            size = sizing.new_size_keep_aspect_ratio(self.resolution, self.slot_size, 'outer')
+            if size[0] < self.resolution[0]:
+                return size
+        return self.resolution
+
+    def _get_draft_size(self, size, capture_size):
+        """Return the minimum size at which a capture of the given size shall
+        be decoded to get the capture size after rotation and cropping.
+        """
+        if self.capture_rotation in (90, 270):
+            rotated = (size[1], size[0])
+        else:
+            rotated = size
+        x1, y1, x2, y2 = sizing.new_size_by_croping_ratio(rotated, capture_size)
+        scale = min(1, max(capture_size[0] / float(x2 - x1), capture_size[1] / float(y2 - y1)))
+        return (int(math.ceil(size[0] * scale)), int(math.ceil(size[1] * scale)))
 
     def _post_process_capture(self, capture_data):
         """Rework capture data.
@@ -192,17 +273,27 @@ class GpCamera(BaseCamera):
         LOGGER.debug(capture_data)
 
         gp_path, effect = capture_data
-        camera_file = self._cam.file_get(gp_path.folder, gp_path.name, gp.GP_FILE_TYPE_NORMAL)
-        if self.delete_internal_memory:
-            LOGGER.debug("Delete capture '%s' from internal memory", gp_path.name)
-            self._cam.file_delete(gp_path.folder, gp_path.name)
-        image = Image.open(io.BytesIO(camera_file.get_data_and_size()))
+        with self._lock:
+            camera_file = self._cam.file_get(gp_path.folder, gp_path.name, gp.GP_FILE_TYPE_NORMAL)
+            if self.delete_internal_memory:
+                LOGGER.debug("Delete capture '%s' from internal memory", gp_path.name)
+                self._cam.file_delete(gp_path.folder, gp_path.name)
+        data = bytes(camera_file.get_data_and_size())
+        image = Image.open(io.BytesIO(data))
+        original, original_size = image, image.size
+        capture_size = self._get_capture_size()
+        # Use JPEG DCT scaling to decode only the needed resolution
+        image.draft('RGB', self._get_draft_size(image.size, capture_size))
         image = self._rotate_image(image, self.capture_rotation)
 
         # Crop to keep aspect ratio of the resolution
-        image = image.crop(sizing.new_size_by_croping_ratio(image.size, self.resolution))
+        box = sizing.new_size_by_croping_ratio(image.size, capture_size)
+        if tuple(box) != (0, 0) + image.size:
+            image = image.crop(box)
         # Resize to fit the resolution
-        image = image.resize(sizing.new_size_keep_aspect_ratio(image.size, self.resolution, 'outer'))
+        size = sizing.new_size_keep_aspect_ratio(image.size, capture_size, 'outer')
+        if tuple(size) != image.size:
+            image = image.resize(size)
 
         if self.capture_flip:
             image = image.transpose(Image.FLIP_LEFT_RIGHT)
@@ -210,11 +301,19 @@ class GpCamera(BaseCamera):
         if effect != 'none':
             image = image.filter(getattr(ImageFilter, effect.upper()))
 
+        if self.raw_passthrough:
+            # Keep the camera file as raw capture, only the EXIF orientation is changed
+            image.raw_data = exif.set_orientation(data, exif.get_orientation(self.capture_rotation,
+                                                                              self.capture_flip))
+        elif image is original and image.size == original_size:
+            # Unchanged capture: keep camera bytes to save it without re-encoding
+            image.raw_data = data
         return image
 
     def set_config_value(self, section, option, value):
         """Set camera configuration.
         """
+        self._lock.acquire()
         try:
             LOGGER.debug('Setting option %s/%s=%s', section, option, value)
             config = self._cam.get_config()
@@ -237,12 +336,15 @@ class GpCamera(BaseCamera):
             self._cam.set_config(config)
         except gp.GPhoto2Error as ex:
             LOGGER.error('Unsupported option %s/%s=%s (%s), configure your DSLR manually', section, option, value, ex)
+        finally:
+            self._lock.release()
 
     def get_config_value(self, section, option):
         """Get camera configuration option.
         """
         try:
-            config = self._cam.get_config()
+            with self._lock:
+                config = self._cam.get_config()
             child = config.get_child_by_name(section).get_child_by_name(option)
             value = child.get_value()
             LOGGER.debug('Getting option %s/%s=%s', section, option, value)
@@ -255,11 +357,14 @@ class GpCamera(BaseCamera):
         """
         self._window = window
         self.preview_flip = flip
+        rect = self.get_rect()
+        self._preview_size = (rect.width, rect.height)
 
         if self._preview_compatible:
             if self._preview_viewfinder:
                 self.set_config_value('imgsettings', 'iso', 400)
                 self.set_config_value('actions', 'viewfinder', 1)
+            self._preview_pipeline.start()
             self._window.show_image(self._get_preview_image())
 
     def preview_countdown(self, timeout, alpha=80):
@@ -292,6 +397,8 @@ class GpCamera(BaseCamera):
         # self.com.write(b'CAMFOC\n')
         # LOGGER.info("Focus Camera")
 
+        self._prepare_countdown(timeout)
+
         shown = False
         first_loop = True
         timer = PoolingTimer(timeout)
@@ -305,7 +412,9 @@ class GpCamera(BaseCamera):
 
             updated_rect = None
             if self._preview_compatible:
-                updated_rect = self._window.show_image(self._get_preview_image())
+                image = self._get_preview_image(0.1)
+                if image:
+                    updated_rect = self._window.show_image(image)
             elif not shown:
                 updated_rect = self._window.show_image(self._get_preview_image())
                 shown = True  # Do not update dummy preview until next overlay update
@@ -333,7 +442,10 @@ class GpCamera(BaseCamera):
         timer = PoolingTimer(timeout)
         if self._preview_compatible:
             while not timer.is_timeout():
-                updated_rect = self._window.show_image(self._get_preview_image())
+                updated_rect = None
+                image = self._get_preview_image(0.1)
+                if image:
+                    updated_rect = self._window.show_image(image)
                 pygame.event.pump()
                 if updated_rect:
                     pygame.display.update(updated_rect)
@@ -346,12 +458,14 @@ class GpCamera(BaseCamera):
     def stop_preview(self):
         """Stop the preview.
         """
+        self._preview_pipeline.stop()
         self._hide_overlay()
         self._window = None
 
     def capture(self, effect=None):
         """Capture a new picture.
         """
+        self._preview_pipeline.stop()  # Live view is not possible during capture
 
         if self._preview_viewfinder:
             self.set_config_value('actions', 'viewfinder', 0)
@@ -457,6 +571,10 @@ class GpCamera(BaseCamera):
         # if self.capture_iso != self.preview_iso:
         #     self.set_config_value('imgsettings', 'iso', self.preview_iso)
 
+        # Download and decode the capture while the next preview is running
+        effect = str(effect or 'none').lower()
+        self._downloads.append((self._downloader.submit(self._download_capture, effect), effect))
+
         self._hide_overlay()  # If stop_preview() has not been called
 
 
@@ -477,38 +595,125 @@ class GpCamera(BaseCamera):
     #
     #     sp.run(f"rm {cur_file}", shell=True, capture_output=False)
 
-    def collect_captures(self):
-        # collect filenames from cam
-
-        LOGGER.debug("in collect captures")
-
-        counter = 3
-
-        # time.sleep(3)
-        gp.gp_camera_exit(self._cam)
-        gp.gp_camera_init(self._cam)
-
-        _, files_o = gp.gp_camera_folder_list_files(self._cam, "/store_00020001/DCIM/100CANON/")
-        files = files_o.keys()
-
-        LOGGER.debug("files on cam")
-        for x in files:
-            LOGGER.debug(x)
-
-        while counter > 0:
-            cur_file = files[-counter]  # we fetch the name of the last file on the cam
-            LOGGER.debug(f"adding file: {cur_file} - counter {counter}")
-
-            img = TKimg()
-            img.folder = "/store_00020001/DCIM/100CANON/"
-            img.name = cur_file
+    def _is_capture_file(self, folder, name):
+        """Return True if the given file is a JPEG file in one of the
+        captures folders.
+        """
+        return folder in self.captures_folders and name.lower().endswith(('.jpg', '.jpeg'))
 
-            self._captures.append((img, "none"))
-            counter -= 1
+    def _list_captures_files(self):
+        """Return the (folder, name) of the capture files in the captures
+        folders (slow on cards holding many files).
+        """
+        files = []
+        for folder in self.captures_folders:
+            try:
+                _, names = gp.gp_camera_folder_list_files(self._cam, folder)
+            except gp.GPhoto2Error as ex:
+                LOGGER.warning("Can not list camera folder '%s': %s", folder, ex)
+                continue
+            files.extend((folder, name) for name in names.keys() if self._is_capture_file(folder, name))
+        return files
+
+    def _add_new_file(self, folder, name):
+        """Add the file in the queue of the files to download if not known.
+        """
+        key = (folder.rstrip('/'), name)
+        if key not in self._known_files and self._is_capture_file(*key):
+            self._known_files.add(key)
+            self._new_files.append(key)
+
+    def _wait_file_events(self, timeout):
+        """Read the camera events until a new capture file is added or the
+        timeout is reached. The lock is released between each event to not
+        block the preview.
+        """
+        timer = PoolingTimer(timeout)
+        while not self._new_files and not timer.is_timeout():
+            with self._lock:
+                event_type, event_data = self._cam.wait_for_event(100)
+            if event_type == gp.GP_EVENT_FILE_ADDED:
+                LOGGER.debug("Camera event: file added %s/%s", event_data.folder, event_data.name)
+                self._add_new_file(event_data.folder, event_data.name)
+
+    def _find_new_capture(self, relist=False):
+        """Return the path of the next capture file. New files are notified
+        by gPhoto2 events; if the camera does not send them, None is returned
+        unless relisting is requested: then the session is re-initialized and
+        the captures folders are listed again (only when no preview is
+        running, it would interrupt the live view).
+
+        :param relist: list the captures folders if no file event is received
+        :type relist: bool
+        """
+        if not self._new_files and not relist:
+            self._wait_file_events(self.EVENT_TIMEOUT)
+        if not self._new_files and not relist:
+            LOGGER.debug("No file event from the camera, list the captures folders later")
+            return None
+
+        timer = PoolingTimer(self.CAPTURE_TIMEOUT)
+        delay = 0.5
+        while not self._new_files:
+            LOGGER.debug("No file event from the camera, list the captures folders")
+            with self._lock:
+                gp.gp_camera_exit(self._cam)
+                gp.gp_camera_init(self._cam)
+                for folder, name in self._list_captures_files():
+                    self._add_new_file(folder, name)
+            if self._new_files:
+                break
+            if timer.is_timeout():
+                raise EnvironmentError("No new capture found in {}".format(self.captures_folders))
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
+
+        gp_path = TKimg()
+        gp_path.folder, gp_path.name = self._new_files.popleft()
+        LOGGER.debug("New capture found: %s/%s", gp_path.folder, gp_path.name)
+        return gp_path
+
+    def _download_capture(self, effect):
+        """Find, download and post-process the last capture (called in
+        the downloader thread). Return None if the capture file is not
+        notified by the camera.
+        """
+        gp_path = self._find_new_capture()
+        if not gp_path:
+            return None
+        return self._post_process_capture((gp_path, effect))
+
+    def get_captures(self):
+        """Return all buffered captures as PIL images (buffer dropped after call).
+        Wait for the captures not yet downloaded.
+        """
+        images = []
+        for future, effect in self._downloads:
+            image = future.result()
+            if image is None:
+                # Not notified by the camera: the live view is over, the
+                # captures folders can be listed
+                self._preview_pipeline.stop()
+                image = self._post_process_capture((self._find_new_capture(relist=True), effect))
+            images.append(image)
+        self.drop_captures()
+        return images
+
+    def drop_captures(self):
+        """Delete all buffered captures, pending downloads are cancelled.
+        """
+        for future, _effect in self._downloads:
+            future.cancel()
+        self._downloads = []
+        self._new_files.clear()  # Files of an aborted sequence
+        super(GpCamera, self).drop_captures()
 
     def quit(self):
         """Close the camera driver, it's definitive.
         """
+        self._preview_pipeline.stop()
+        self.drop_captures()
+        self._downloader.shutdown()
         if self._cam:
             del self._gp_logcb  # Uninstall log callback
             self._cam.exit()
@@ -33,6 +33,12 @@ class HybridRpiCamera(RpiCamera):
         """
         return self._gp_cam._post_process_capture(capture_data)
 
+    def set_slot_size(self, size):
+        """Set the slot size of both cameras.
+        """
+        super(HybridRpiCamera, self).set_slot_size(size)
+        self._gp_cam.set_slot_size(size)
+
     def capture(self, effect=None):
         """Capture a picture in a file.
         """
@@ -40,6 +46,16 @@ class HybridRpiCamera(RpiCamera):
 
         self._hide_overlay()  # If stop_preview() has not been called
 
+    def get_captures(self):
+        """Return all buffered captures as PIL images (buffer dropped after call).
+        """
+        return self._gp_cam.get_captures()
+
+    def drop_captures(self):
+        """Delete all buffered captures.
+        """
+        self._gp_cam.drop_captures()
+
     def quit(self):
         """Close the camera driver, it's definitive.
         """
@@ -75,6 +91,12 @@ class HybridCvCamera(CvCamera):
         """
         return self._gp_cam._post_process_capture(capture_data)
 
+    def set_slot_size(self, size):
+        """Set the slot size of both cameras.
+        """
+        super(HybridCvCamera, self).set_slot_size(size)
+        self._gp_cam.set_slot_size(size)
+
     def capture(self, effect=None):
         """Capture a picture in a file.
         """
@@ -82,6 +104,16 @@ class HybridCvCamera(CvCamera):
 
         self._hide_overlay()  # If stop_preview() has not been called
 
+    def get_captures(self):
+        """Return all buffered captures as PIL images (buffer dropped after call).
+        """
+        return self._gp_cam.get_captures()
+
+    def drop_captures(self):
+        """Delete all buffered captures.
+        """
+        self._gp_cam.drop_captures()
+
     def quit(self):
         """Close the camera driver, it's definitive.
         """
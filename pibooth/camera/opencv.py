@@ -2,17 +2,16 @@
 
 import time
 import pygame
-try:
-    import cv2
-    import numpy as np
-except ImportError:
-    cv2 = None  # OpenCV is optional
 from PIL import Image
 from pibooth.pictures import sizing
-from pibooth.utils import PoolingTimer, LOGGER
+from pibooth.utils import PoolingTimer, LOGGER, LazyModule
 from pibooth.language import get_translated_text
 from pibooth.camera.base import BaseCamera
 
+# OpenCV is optional and slow to import, load it only when needed
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+
 
 def get_cv_camera_proxy(port=None):
     """Return camera proxy if an OpenCV compatible camera is found
@@ -78,11 +77,8 @@ class CvCamera(BaseCamera):
             # # Remove alpha from overlay
             # self._overlay = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGBA2RGB)
 
-            ct_rect = self.get_countdown_rect()
-            ct_pil_image = self.build_countdown_top((ct_rect.width, ct_rect.height), str(text))
-            LOGGER.debug("created countdown image to display")
-            #ct_pil_image.save("countdown_img"+text+".png")
-            updated = self._window.show_image(ct_pil_image, pos='top')
+            self._countdown.prepare(self._get_countdown_size(), ())
+            updated = self._window.show_image(self._countdown.get(text), pos='top')
 
             pygame.event.pump()
             if updated:
@@ -171,6 +167,8 @@ class CvCamera(BaseCamera):
         if timeout < 1:
             raise ValueError("Start time shall be greater than 0")
 
+        self._prepare_countdown(timeout)
+
         timer = PoolingTimer(timeout)
         while not timer.is_timeout():
             remaining = int(timer.remaining() + 1)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import time
+import threading
+from pibooth.utils import LOGGER
+
+
+class PreviewPipeline(object):
+
+    """Produce the preview frames in background threads: the capture
+    thread grabs the frames from the camera and keeps only the latest
+    one, the process thread decodes and scales it. The UI thread only
+    gets the last processed frame to display it.
+
+    :attr captured: number of frames grabbed from the camera
+    :type captured: int
+    :attr displayed: number of frames given to the UI
+    :type displayed: int
+    :attr dropped: number of frames replaced by a newer one before being used
+    :type dropped: int
+    """
+
+    def __init__(self, grab, process):
+        self._grab = grab
+        self._process = process
+        self._condition = threading.Condition()
+        self._threads = []
+        self._running = False
+        self._error = None
+        self._raw = None
+        self._frame = None
+        self._start_time = None
+        self.captured = 0
+        self.displayed = 0
+        self.dropped = 0
+
+    @property
+    def fps(self):
+        """Frame rate of the frames given to the UI.
+        """
+        if not self._start_time:
+            return 0.
+        return self.displayed / max(time.time() - self._start_time, 1e-3)
+
+    def is_running(self):
+        """Return True if the threads are running.
+        """
+        return self._running
+
+    def _run(self, func):
+        """Run the given loop, any error is forwarded to the UI thread.
+        """
+        try:
+            while self._running:
+                func()
+        except Exception as ex:  # Forward any error
+            with self._condition:
+                self._error = ex
+                self._running = False
+                self._condition.notify_all()
+
+    def _capture_step(self):
+        """Grab a new frame, the previous one is dropped if not processed.
+        """
+        data = self._grab()
+        with self._condition:
+            if self._raw is not None:
+                self.dropped += 1
+            self._raw = data
+            self.captured += 1
+            self._condition.notify_all()
+
+    def _process_step(self):
+        """Process the latest grabbed frame.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._raw is not None or not self._running)
+            data, self._raw = self._raw, None
+        if data is None:
+            return
+        frame = self._process(data)
+        with self._condition:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._condition.notify_all()
+
+    def start(self):
+        """Start the capture and process threads.
+        """
+        if self._running:
+            return
+        self._running = True
+        self._error = None
+        self._raw = self._frame = None
+        self.captured = self.displayed = self.dropped = 0
+        self._start_time = time.time()
+        self._threads = [threading.Thread(target=self._run, args=(func,), name=name, daemon=True)
+                         for name, func in (('PreviewCapture', self._capture_step),
+                                            ('PreviewProcess', self._process_step))]
+        for thread in self._threads:
+            thread.start()
+
+    def get_frame(self, timeout=None):
+        """Return the latest processed frame or None if no new frame is
+        available before the timeout.
+
+        :param timeout: maximum time to wait for a new frame in seconds
+        :type timeout: float
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._frame is not None or not self._running, timeout)
+            if self._error:
+                error, self._error = self._error, None
+                raise error
+            frame, self._frame = self._frame, None
+        if frame is not None:
+            self.displayed += 1
+        return frame
+
+    def stop(self):
+        """Stop the threads and log the statistics.
+        """
+        if not self._threads:
+            return
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        LOGGER.debug("Preview: %.1f FPS displayed, %s frames captured, %s dropped",
+                     self.fps, self.captured, self.dropped)
@@ -59,14 +59,15 @@ class RpiCamera(BaseCamera):
         """Add an image as an overlay.
         """
         if self._window:  # No window means no preview displayed
-            rect = self.get_rect(self._cam.MAX_RESOLUTION)
-
-            # Create an image padded to the required size (required by picamera)
-            size = (((rect.width + 31) // 32) * 32, ((rect.height + 15) // 16) * 16)
-
-            image = self.build_overlay(size, str(text), alpha)
-            self._overlay = self._cam.add_overlay(image.tobytes(), image.size, layer=3,
-                                                  window=tuple(rect), fullscreen=False)
+            size = self._get_countdown_size()
+            if self._countdown.prepare(size, (), alpha):
+                self._hide_overlay()  # Size has changed
+            if self._overlay:
+                self._overlay.update(self._countdown.get(text))
+            else:
+                rect = self.get_rect(self._cam.MAX_RESOLUTION)
+                self._overlay = self._cam.add_overlay(self._countdown.get(text), size, layer=3,
+                                                      window=tuple(rect), fullscreen=False)
 
     def _hide_overlay(self):
         """Remove any existing overlay.
@@ -75,6 +76,17 @@ class RpiCamera(BaseCamera):
             self._cam.remove_overlay(self._overlay)
             self._overlay = None
 
+    def _get_countdown_size(self):
+        """Return the size of the overlay padded to the size required by picamera.
+        """
+        rect = self.get_rect(self._cam.MAX_RESOLUTION)
+        return (((rect.width + 31) // 32) * 32, ((rect.height + 15) // 16) * 16)
+
+    def _build_countdown_sprite(self, size, text, alpha):
+        """Return the overlay buffer of the given text.
+        """
+        return self.build_overlay(size, text, alpha).tobytes()
+
     def _post_process_capture(self, capture_data):
         """Rework capture data.
 
@@ -83,7 +95,10 @@ class RpiCamera(BaseCamera):
         """
         # "Rewind" the stream to the beginning so we can read its content
         capture_data.seek(0)
-        return Image.open(capture_data)
+        image = Image.open(capture_data)
+        # Keep camera bytes to save the capture without re-encoding
+        image.raw_data = capture_data.getvalue()
+        return image
 
     def preview(self, window, flip=True):
         """Display a preview on the given Rect (flip if necessary).
@@ -114,11 +129,11 @@ class RpiCamera(BaseCamera):
         if not self._cam.preview:
             raise EnvironmentError("Preview shall be started first")
 
+        self._prepare_countdown(timeout, alpha)
         while timeout > 0:
-            self._show_overlay(timeout, alpha)
+            self._show_overlay(timeout, alpha)  # Overlay updated with the new sprite
             time.sleep(1)
             timeout -= 1
-            self._hide_overlay()
 
         self._show_overlay(get_translated_text('smile'), alpha)
 
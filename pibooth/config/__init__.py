@@ -1,4 +1,13 @@
 # -*- coding: utf-8 -*-
 
 from pibooth.config.parser import PiConfigParser
-from pibooth.config.menu import PiConfigMenu
+
+
+def __getattr__(name):
+    """Import the settings menu only when used (pygame-menu is slow to
+    import).
+    """
+    if name == 'PiConfigMenu':
+        from pibooth.config.menu import PiConfigMenu
+        return PiConfigMenu
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
@@ -212,6 +212,11 @@ class PiConfigMenu(object):
                                    section='GENERAL',
                                    option='plugins_disabled',
                                    plugin=plugin)
+            for hook_name, stats in self.pm.get_hook_stats(plugin):
+                text = "{}: {:.1f} ms avg, {:.1f} ms max".format(hook_name, stats.mean * 1000, stats.max * 1000)
+                if stats.over_budget:
+                    text += ", {} over budget".format(stats.over_budget)
+                menu.add.label(text, font_size=14)
         return menu
 
     def _on_keyboard_event(self, text):
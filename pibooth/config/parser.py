@@ -52,6 +52,14 @@ DEFAULT = odict((
                 ('',
                  "Plugin names to be disabled after startup (list of quoted names accepted)",
                  None, None)),
+            ("plugins_budget",
+                (0,
+                 "Maximum duration in seconds of an external plugin state hook call before logging a warning (0 to disable)",
+                 "Plugins time budget", ['0', '0.02', '0.05', '0.1', '0.2', '0.5', '1'])),
+            ("plugins_budget_disable",
+                (False,
+                 "Disable an external plugin exceeding its time budget several times in a row",
+                 "Disable slow plugins", ['True', 'False'])),
             ("vkeyboard",
                 (False,
                  "Enable a virtual keyboard in the settings interface",
@@ -214,14 +222,26 @@ DEFAULT = odict((
                 (True,
                  "Delete captures from camera internal memory (when applicable)",
                  None, None)),
+            ("captures_folders",
+                ("/store_00020001/DCIM/100CANON",
+                 "Camera folders where the captures taken with the shutter are stored (list of quoted paths accepted)",
+                 None, None)),
+            ("raw_passthrough",
+                (False,
+                 "Store the original camera files as raw captures, rotation and flip are recorded in EXIF (when applicable)",
+                 None, None)),
         ))
      ),
     ("PRINTER",
         odict((
             ("printer_name",
                 ("default",
-                 "Name of the printer defined in CUPS (or use the 'default' one)",
+                 "Name of the printer defined in CUPS (or use the 'default' one), list of quoted names to use several printers",
                  None, None)),
+            ("printer_routing",
+                ("least-loaded",
+                 "Choice of the printer when several are used: 'least-loaded' (less jobs in queue) or 'round-robin'",
+                 "Printers routing", ['least-loaded', 'round-robin'])),
             ('format',
              ('standard', 'Defines what format is printed.'
                           'standard: 6x4 inch, stripe: 6x2 inch 2 pcs',
@@ -250,6 +270,14 @@ DEFAULT = odict((
                 (1,
                  "Print 1, 2, 3 or 4 picture copies per page",
                  'Number of copies per page', [str(i) for i in range(1, 5)])),
+            ("batch_delay",
+                (0,
+                 "How long in seconds a single stripe waits for the next one to be printed on the same page (0 to disable)",
+                 'Stripes batching delay', [str(i) for i in range(0, 121, 10)])),
+            ("native_resolution",
+                (False,
+                 "Render the pages at the resolution and media size of the printer (read from CUPS)",
+                 'Native printer resolution', ['True', 'False'])),
         ))
      ),
     ("CONTROLS",
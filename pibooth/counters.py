@@ -1,7 +1,24 @@
 # -*- coding: utf-8 -*-
 
+"""Pibooth counters stored in a SQLite database.
+
+The changes are not written immediately: they are coalesced and flushed
+in one transaction after a short delay (or when :py:meth:`Counters.flush`
+is called). The database is in WAL mode, thus a power cut never leaves a
+partially written file. Each change is also recorded with its timestamp
+in an ``events`` table for analytics.
+"""
+
+import time
 import pickle
+import sqlite3
+import threading
 import os.path as osp
+from pibooth.utils import LOGGER
+
+
+# Delay in seconds before writing the changes in the database
+FLUSH_DELAY = 2.
 
 
 class Counters(object):
@@ -10,8 +27,16 @@ class Counters(object):
         self.data = kwargs.copy()
         self.default = kwargs
         self.filename = osp.abspath(osp.expanduser(filename))
-        if osp.isfile(self.filename):
-            self.load()
+        self._changes = []  # (timestamp, name, value) not yet written
+        self._lock = threading.RLock()
+        self._timer = None
+        self._db = sqlite3.connect(self.filename, check_same_thread=False)
+        with self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS events (timestamp REAL, name TEXT, value)")
+        self.load()
 
     def __str__(self):
         return ", ".join("{}:{}".format(key, value) for key, value in self.data.items())
@@ -37,11 +62,47 @@ class Counters(object):
         """Called each time an attribute is set.
         """
         if name != 'data' and name in self.data:
-            self.data[name] = value
-            self.save()
+            with self._lock:
+                self.data[name] = value
+                self._changes.append((time.time(), name, value))
+                self._schedule_flush()
         else:
             super(Counters, self).__setattr__(name, value)
 
+    def _schedule_flush(self):
+        """Write the changes after :py:data:`FLUSH_DELAY`, the ones done
+        meanwhile are written in the same transaction.
+        """
+        if not self._timer:
+            self._timer = threading.Timer(FLUSH_DELAY, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _load_legacy(self):
+        """Return the counters of the pickle file used by previous versions
+        (None if not found).
+        """
+        legacy = osp.splitext(self.filename)[0] + '.pickle'
+        if legacy == self.filename or not osp.isfile(legacy):
+            return None
+        with open(legacy, 'rb') as fp:
+            LOGGER.info("Import counters from '%s'", legacy)
+            return pickle.load(fp)
+
+    def setdefault(self, name, value):
+        """Add a counter if it does not exist yet (its saved value is kept).
+
+        :param name: name of the counter
+        :type name: str
+        :param value: default value of the counter
+        :type value: int
+        """
+        with self._lock:
+            self.default[name] = value
+            if name not in self.data:
+                row = self._db.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+                self.data[name] = row[0] if row else value
+
     def names(self):
         """Return the list of counters.
         """
@@ -50,17 +111,73 @@ class Counters(object):
     def load(self):
         """Load the saved counters.
         """
-        with open(self.filename, 'rb') as fp:
-            self.data.update(pickle.load(fp))
+        with self._lock:
+            self.flush()
+            saved = dict(self._db.execute("SELECT name, value FROM counters"))
+            if not saved:
+                saved = self._load_legacy() or {}
+                if saved:
+                    self._changes.extend((time.time(), name, value) for name, value in saved.items())
+                    self.flush()
+            self.data.update(saved)
 
     def reset(self):
         """Reset all counters.
         """
-        self.data = self.default.copy()
-        self.save()
+        with self._lock:
+            self.data = self.default.copy()
+            self._changes.extend((time.time(), name, value) for name, value in self.data.items())
+            self.save()
 
     def save(self):
-        """Save the current counters in a file.
+        """Save the current counters in the database.
+        """
+        self.flush()
+
+    def flush(self):
+        """Write the pending changes in the database (one transaction).
+        """
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            if not self._changes:
+                return
+            changes, self._changes = self._changes, []
+            latest = dict((name, value) for _, name, value in changes)
+            try:
+                with self._db:
+                    self._db.executemany("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)",
+                                         latest.items())
+                    self._db.executemany("INSERT INTO events (timestamp, name, value) VALUES (?, ?, ?)",
+                                         changes)
+            except sqlite3.Error as ex:
+                LOGGER.error("Can not save counters in '%s': %s", self.filename, ex)
+                self._changes = changes + self._changes  # Retry at next flush
+                self._schedule_flush()
+
+    def get_history(self, name=None, since=0):
+        """Return the list of (timestamp, name, value) of the changes of the
+        counters.
+
+        :param name: name of the counter (all counters if None)
+        :type name: str
+        :param since: timestamp of the oldest change to return
+        :type since: float
+        """
+        with self._lock:
+            self.flush()
+            if name:
+                cursor = self._db.execute("SELECT timestamp, name, value FROM events WHERE name = ?"
+                                          " AND timestamp >= ? ORDER BY rowid", (name, since))
+            else:
+                cursor = self._db.execute("SELECT timestamp, name, value FROM events WHERE timestamp >= ?"
+                                          " ORDER BY rowid", (since,))
+            return cursor.fetchall()
+
+    def close(self):
+        """Write the pending changes and close the database.
         """
-        with open(self.filename, 'wb') as fp:
-            pickle.dump(self.data, fp, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self.flush()
+            self._db.close()
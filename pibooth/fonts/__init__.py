@@ -3,6 +3,7 @@
 import os
 import os.path as osp
 import fnmatch
+import functools
 from difflib import SequenceMatcher
 import pygame
 from PIL import ImageFont
@@ -10,6 +11,15 @@ from PIL import ImageFont
 
 EMBEDDED_FONT_PATH = osp.dirname(osp.abspath(__file__))
 
+# Number of font objects kept opened (per library)
+FONTS_CACHE_SIZE = 32
+
+# Number of fitted sizes kept for (text, font, rectangle)
+SIZES_CACHE_SIZE = 256
+
+# Size used to measure a text before estimating the size which fit a rectangle
+REFERENCE_SIZE = 100
+
 
 def get_available_fonts():
     """Return the list of available fonts.
@@ -24,6 +34,7 @@ def get_available_fonts():
     return sorted(fonts_list, key=lambda s: s.lower())
 
 
+@functools.lru_cache(maxsize=128)
 def get_filename(name):
     """Return absolute path to a font definition file located in the current
     package.
@@ -53,6 +64,72 @@ def get_filename(name):
     raise ValueError('System font "{0}" unknown, maybe you mean "{1}"'.format(name, most_similar))
 
 
+@functools.lru_cache(maxsize=FONTS_CACHE_SIZE)
+def _load_pil_font(font_name, size):
+    """Return the PIL font object for the given size (opened only once).
+    """
+    return ImageFont.truetype(font_name, size)
+
+
+@functools.lru_cache(maxsize=FONTS_CACHE_SIZE)
+def _load_pygame_font(font_name, size):
+    """Return the pygame font object for the given size (opened only once).
+    """
+    return pygame.font.Font(get_filename(font_name), size)
+
+
+def _fit_size(max_width, max_height, measure):
+    """Return the font size which fit the given rectangle.
+
+    The size of the text measured at :py:attr:`REFERENCE_SIZE` is used to
+    estimate the searched size, then the binary search is only done around
+    this estimation (the whole range is used if the estimation is wrong).
+
+    :param max_width: width of the rect to fit
+    :type max_width: int
+    :param max_height: height of the rect to fit
+    :type max_height: int
+    :param measure: function returning the (width, height) of the text for a given size
+    :type measure: callable
+
+    :return: font size
+    :rtype: int
+    """
+    def fit(k):
+        font_size = measure(k)
+        return font_size[0] <= max_width and font_size[1] <= max_height
+
+    start, end = 0, int(max_height * 2)
+    ref_width, ref_height = measure(REFERENCE_SIZE)
+    if ref_width > 0 and ref_height > 0:
+        estimation = int(min(max_width / ref_width, max_height / ref_height) * REFERENCE_SIZE)
+        lower, upper = max(0, estimation - 1), min(end, estimation + 2)
+        if lower < upper and fit(lower) and not fit(upper):
+            start, end = lower + 1, upper
+
+    while start < end:
+        k = (start + end) // 2
+        if fit(k):
+            start = k + 1
+        else:
+            end = k
+    return start
+
+
+@functools.lru_cache(maxsize=SIZES_CACHE_SIZE)
+def _get_pil_font_size(text, font_name, max_width, max_height):
+    """Return the PIL font size which fit the text to the given rectangle.
+    """
+    return _fit_size(max_width, max_height, lambda k: _load_pil_font(font_name, k).getsize(text))
+
+
+@functools.lru_cache(maxsize=SIZES_CACHE_SIZE)
+def _get_pygame_font_size(text, font_name, max_width, max_height):
+    """Return the pygame font size which fit the text to the given rectangle.
+    """
+    return _fit_size(max_width, max_height, lambda k: _load_pygame_font(font_name, k).size(text))
+
+
 def get_pil_font(text, font_name, max_width, max_height):
     """Create the PIL font object which fit the text to the given rectangle.
 
@@ -68,16 +145,7 @@ def get_pil_font(text, font_name, max_width, max_height):
     :return: PIL.Font instance
     :rtype: object
     """
-    start, end = 0, int(max_height * 2)
-    while start < end:
-        k = (start + end) // 2
-        font = ImageFont.truetype(font_name, k)
-        font_size = font.getsize(text)
-        if font_size[0] > max_width or font_size[1] > max_height:
-            end = k
-        else:
-            start = k + 1
-    return ImageFont.truetype(font_name, start)
+    return _load_pil_font(font_name, _get_pil_font_size(text, font_name, max_width, max_height))
 
 
 def get_pygame_font(text, font_name, max_width, max_height):
@@ -95,17 +163,18 @@ def get_pygame_font(text, font_name, max_width, max_height):
     :return: pygame.Font instance
     :rtype: object
     """
-    start, end = 0, int(max_height * 2)
-    while start < end:
-        k = (start + end) // 2
-        font = pygame.font.Font(get_filename(font_name), k)
-        font_size = font.size(text)
-        if font_size[0] > max_width or font_size[1] > max_height:
-            end = k
-        else:
-            start = k + 1
-        del font  # Run garbage collector, to avoid opening too many files
-    return pygame.font.Font(get_filename(font_name), start)
+    return _load_pygame_font(font_name, _get_pygame_font_size(text, font_name, max_width, max_height))
+
+
+def drop_cache():
+    """Close all cached fonts and forget fitted sizes. It shall be called
+    if the pygame font module is re-initialized.
+    """
+    get_filename.cache_clear()
+    _load_pil_font.cache_clear()
+    _load_pygame_font.cache_clear()
+    _get_pil_font_size.cache_clear()
+    _get_pygame_font_size.cache_clear()
 
 
 CURRENT = get_filename('Amatic-Bold')  # Dynamically set at startup
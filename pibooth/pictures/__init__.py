@@ -2,19 +2,32 @@
 import os
 import os.path as osp
 import sys
+import hashlib
+import tempfile
+import functools
 
-from PIL import Image, ImageOps
+from PIL import Image
 import pygame
 from pibooth import language
 from pibooth import fonts
 from pibooth.pictures import factory
 from pibooth.pictures import sizing
+from pibooth.utils import LOGGER
 
 
 AUTO = 'auto'
 PORTRAIT = 'portrait'
 LANDSCAPE = 'landscape'
 
+# Directory where the rasterized images are stored (None to disable)
+CACHE_DIR = None
+
+# Maximum size in bytes of the files in the cache directory
+CACHE_DISK_SIZE = 200 * 1024 * 1024
+
+# Number of rasterized images kept in memory
+CACHE_SIZE = 32
+
 
 def get_filename(name):
     """Return absolute path to a picture located in the current package.
@@ -31,6 +44,15 @@ def get_filename(name):
         return osp.join(osp.dirname(osp.abspath(__file__)), 'assets', name)
 
 
+@functools.lru_cache(maxsize=32)
+def _get_colorize_luts(color, bg_color):
+    """Return the per-channel lookup tables mapping the luminance to the
+    gradient from bg_color (black) to color (white).
+    """
+    return tuple([int(bg + (fg - bg) * level / 255. + 0.5) for level in range(256)]
+                 for fg, bg in zip(color, bg_color))
+
+
 def colorize_pil_image(pil_image, color, bg_color=None):
     """Convert a picto in white to the corresponding color.
 
@@ -43,11 +65,13 @@ def colorize_pil_image(pil_image, color, bg_color=None):
     """
     if not bg_color:
         bg_color = (abs(color[0] - 255), abs(color[1] - 255), abs(color[2] - 255))
-    _, _, _, alpha = pil_image.split()
+    luts = _get_colorize_luts(tuple(color[:3]), tuple(bg_color[:3]))
     gray_pil_image = pil_image.convert('L')
-    new_pil_image = ImageOps.colorize(gray_pil_image, black=bg_color, white=color)
-    new_pil_image.putalpha(alpha)
-    return new_pil_image
+    # One LUT pass per channel on the luminance (no intermediate RGB image)
+    bands = [gray_pil_image.point(lut) for lut in luts]
+    if 'A' in pil_image.getbands():
+        return Image.merge('RGBA', bands + [pil_image.getchannel('A')])
+    return Image.merge('RGB', bands)
 
 
 def get_pygame_main_color(surface):
@@ -57,10 +81,102 @@ def get_pygame_main_color(surface):
     return tuple(monopixel_surface.get_at((0, 0)))
 
 
+def _get_file_digest(path):
+    """Return the hash of the given file content (computed once per file
+    modification), None if the file does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return _hash_file(path, stat.st_mtime_ns, stat.st_size)
+
+
+@functools.lru_cache(maxsize=128)
+def _hash_file(path, mtime, size):
+    """Return the hash of the file content (file modification time and size
+    are part of the cache key).
+    """
+    with open(path, 'rb') as fp:
+        return hashlib.sha1(fp.read()).hexdigest()
+
+
+def _read_cache_file(filename):
+    """Return the (data, size, mode) stored in the cache file or None if
+    it can not be read.
+    """
+    try:
+        with open(filename, 'rb') as fp:
+            mode, width, height = fp.readline().decode().split()
+            data = fp.read()
+        os.utime(filename)  # Used to remove the less recently used files
+        return data, (int(width), int(height)), mode
+    except (OSError, ValueError, UnicodeDecodeError):
+        return None
+
+
+def _write_cache_file(filename, data, size, mode):
+    """Store the (data, size, mode) in the cache file, the oldest files are
+    removed if the cache directory exceeds its maximum size.
+    """
+    try:
+        if not osp.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR)
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write('{} {} {}\n'.format(mode, size[0], size[1]).encode())
+            fp.write(data)
+        os.replace(tmp, filename)  # Atomic, never read a partial file
+
+        files = [osp.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith('.raw')]
+        files = sorted((os.stat(name).st_mtime, os.stat(name).st_size, name) for name in files)
+        total = sum(size for _, size, _ in files)
+        while files and total > CACHE_DISK_SIZE:
+            _, size, name = files.pop(0)
+            os.remove(name)
+            total -= size
+    except OSError as ex:
+        LOGGER.warning("Can not write image in cache: %s", ex)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _get_raster(path, digest, size, antialiasing, crop, color, bg_color):
+    """Return the (data, size, mode) of the image colorized, cropped and
+    resized. The result is stored in the cache directory: the key is the
+    file content hash and the transformation parameters.
+    """
+    filename = None
+    if CACHE_DIR:
+        key = repr((digest, size, antialiasing, crop, color, bg_color)).encode()
+        filename = osp.join(CACHE_DIR, hashlib.sha1(key).hexdigest() + '.raw')
+        result = _read_cache_file(filename)
+        if result:
+            return result
+
+    if digest:
+        pil_image = Image.open(path)
+    else:
+        pil_image = Image.new('RGBA', size, (0, 0, 0, 0))
+
+    if color:
+        pil_image = colorize_pil_image(pil_image, color, bg_color)
+
+    if crop:
+        pil_image = pil_image.crop(sizing.new_size_by_croping_ratio(pil_image.size, size))
+    pil_image = pil_image.resize(sizing.new_size_keep_aspect_ratio(pil_image.size, size),
+                                 Image.ANTIALIAS if antialiasing else Image.NEAREST)
+
+    result = (pil_image.tobytes(), pil_image.size, pil_image.mode)
+    if filename:
+        _write_cache_file(filename, *result)
+    return result
+
+
 def get_pygame_image(name, size=None, antialiasing=True, hflip=False, vflip=False,
                      crop=False, angle=0, color=(255, 255, 255), bg_color=None):
     """Return a Pygame image. If a size is given, the image is
-    resized keeping the original image's aspect ratio.
+    resized keeping the original image's aspect ratio. The colorized
+    and resized image is cached in memory and in :py:data:`CACHE_DIR`.
 
     :param name: name of an image located in language folders
     :type name: str
@@ -88,20 +204,11 @@ def get_pygame_image(name, size=None, antialiasing=True, hflip=False, vflip=Fals
     if not size and not color:
         image = pygame.image.load(path).convert()
     else:
-        if osp.isfile(path):
-            pil_image = Image.open(path)
-        else:
-            pil_image = Image.new('RGBA', size, (0, 0, 0, 0))
-
-        if color:
-            pil_image = colorize_pil_image(pil_image, color, bg_color)
-
-        if crop:
-            pil_image = pil_image.crop(sizing.new_size_by_croping_ratio(pil_image.size, size))
-        pil_image = pil_image.resize(sizing.new_size_keep_aspect_ratio(pil_image.size, size),
-                                     Image.ANTIALIAS if antialiasing else Image.NEAREST)
-
-        image = pygame.image.frombuffer(pil_image.tobytes(), pil_image.size, pil_image.mode)
+        data, image_size, mode = _get_raster(path, _get_file_digest(path), tuple(size) if size else None,
+                                             antialiasing, crop, color and tuple(color),
+                                             bg_color and tuple(bg_color))
+        # Copy the data, the surface may be modified by the caller
+        image = pygame.image.frombuffer(bytearray(data), image_size, mode)
 
     if hflip or vflip:
         image = pygame.transform.flip(image, hflip, vflip)
@@ -179,9 +286,9 @@ def get_stripe_factory(captures, paper_format=(4, 6),force_pil=False, dpi=600):
     if paper_format[0] > paper_format[1]:
         paper_format = (paper_format[1], paper_format[0])
 
-    size = (paper_format[0] * dpi, paper_format[1] * dpi)
+    size = (int(paper_format[0] * dpi), int(paper_format[1] * dpi))
 
-    if not factory.cv2 or force_pil:
+    if force_pil or not factory.cv2:
         return factory.PilPictureFactory(size[0], size[1], *captures)
 
     # For generating image for printing this one is taken
@@ -210,11 +317,11 @@ def get_picture_factory(captures, orientation=AUTO, paper_format=(4, 6), force_p
     if paper_format[0] > paper_format[1]:
         paper_format = (paper_format[1], paper_format[0])
 
-    size = (paper_format[0] * dpi, paper_format[1] * dpi)
+    size = (int(paper_format[0] * dpi), int(paper_format[1] * dpi))
     if orientation == LANDSCAPE:
         size = (size[1], size[0])
 
-    if not factory.cv2 or force_pil:
+    if force_pil or not factory.cv2:
         return factory.PilPictureFactory(size[0], size[1], *captures)
 
     # For generating image for printing this one is taken
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""Edit EXIF metadata of JPEG files without decoding the image data.
+"""
+
+import struct
+from PIL import Image
+
+
+ORIENTATION_TAG = 0x0112
+
+# EXIF orientation of an image rotated counter-clockwise (same direction
+# than PIL transpositions) then optionally flipped horizontally
+ORIENTATIONS = {(0, False): 1,
+                (0, True): 2,
+                (90, False): 8,
+                (90, True): 7,
+                (180, False): 3,
+                (180, True): 4,
+                (270, False): 6,
+                (270, True): 5}
+
+
+def get_orientation(rotation, flip=False):
+    """Return the EXIF orientation value corresponding to the given rotation
+    and horizontal flip.
+
+    :param rotation: rotation in degrees: 0, 90, 180 or 270
+    :type rotation: int
+    :param flip: image is flipped horizontally after rotation
+    :type flip: bool
+
+    :return: EXIF orientation from 1 to 8
+    :rtype: int
+    """
+    return ORIENTATIONS[(rotation % 360, bool(flip))]
+
+
+def _iter_segments(data):
+    """Yield (marker, start, end) of the JPEG segments located before
+    the image data.
+    """
+    pos = 2
+    while pos + 4 <= len(data) and data[pos] == 0xFF:
+        marker = data[pos + 1]
+        if marker in (0xDA, 0xD9):  # Start Of Scan or End Of Image
+            break
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        yield marker, pos, pos + 2 + length
+        pos += 2 + length
+
+
+def _patch_orientation(data, offset, orientation):
+    """Set the orientation tag of the IFD0 of the TIFF structure starting at
+    offset. Return False if the tag is not found.
+    """
+    endian = {b'II': '<', b'MM': '>'}.get(bytes(data[offset:offset + 2]))
+    if not endian:
+        return False
+    ifd = offset + struct.unpack(endian + 'I', data[offset + 4:offset + 8])[0]
+    count = struct.unpack(endian + 'H', data[ifd:ifd + 2])[0]
+    for i in range(count):
+        entry = ifd + 2 + i * 12
+        tag, type_ = struct.unpack(endian + 'HH', data[entry:entry + 4])
+        if tag == ORIENTATION_TAG and type_ == 3:  # SHORT value
+            data[entry + 8:entry + 10] = struct.pack(endian + 'H', orientation)
+            return True
+    return False
+
+
+def _build_segment(exif):
+    """Return the APP1 segment for the given EXIF data.
+    """
+    payload = exif.tobytes()
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+
+def set_orientation(data, orientation):
+    """Return the given JPEG file with its EXIF orientation set. The
+    tag is patched in place when it exists, else the EXIF segment is
+    rebuilt. The image data are never decoded.
+
+    :param data: JPEG file content
+    :type data: bytes
+    :param orientation: EXIF orientation from 1 to 8
+    :type orientation: int
+
+    :return: JPEG file content
+    :rtype: bytes
+    """
+    if data[:2] != b'\xff\xd8':
+        raise ValueError("Data are not a JPEG file")
+    data = bytearray(data)
+    for marker, start, end in _iter_segments(data):
+        if marker == 0xE1 and data[start + 4:start + 10] == b'Exif\x00\x00':
+            try:
+                if _patch_orientation(data, start + 10, orientation):
+                    return bytes(data)
+            except struct.error:
+                pass  # Corrupted EXIF, rebuild it
+            exif = Image.Exif()
+            exif.load(bytes(data[start + 4:end]))
+            exif[ORIENTATION_TAG] = orientation
+            return bytes(data[:start]) + _build_segment(exif) + bytes(data[end:])
+
+    if orientation == 1:
+        return bytes(data)  # Default orientation
+    exif = Image.Exif()
+    exif[ORIENTATION_TAG] = orientation
+    return bytes(data[:2]) + _build_segment(exif) + bytes(data[2:])
@@ -2,16 +2,48 @@
 
 import os
 import os.path as osp
+from collections import OrderedDict as odict
 from pibooth import fonts
-from pibooth.utils import LOGGER
+from pibooth.utils import LOGGER, LazyModule
 from pibooth.pictures import sizing
 from PIL import Image, ImageDraw
 
-try:
-    import cv2
-    import numpy as np
-except ImportError:
-    cv2 = None
+# OpenCV is optional and slow to import, load it only when needed
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+
+
+def _get_mtime(path):
+    """Return the last modification time of the given file or None if
+    no path is given.
+    """
+    if path and osp.isfile(path):
+        return osp.getmtime(path)
+    return None
+
+
+class PictureTemplate(object):
+
+    """Pre-rendered elements of a picture which do not depend on the captures.
+
+    :attr background: canvas ready to receive the captures (depends on the factory implementation)
+    :type background: object
+    :attr overlay: resized overlay or None (depends on the factory implementation)
+    :type overlay: object
+    :attr rects: list of (x, y, width, height) of each capture slot
+    :type rects: list
+    :attr texts: list of (color, position, mask) used to draw the texts
+    :type texts: list
+    :attr texts_key: key of the texts currently rendered
+    :type texts_key: tuple
+    """
+
+    def __init__(self, background, overlay, rects):
+        self.background = background
+        self.overlay = overlay
+        self.rects = rects
+        self.texts = []
+        self.texts_key = None
 
 
 class PictureFactory(object):
@@ -43,6 +75,14 @@ class PictureFactory(object):
     RIGHT = 'right'
     LEFT = 'left'
 
+    MATRIX = 'matrix'
+    STRIPE = 'stripe'
+
+    # Templates are shared by all factories, the key is built from the
+    # options which do not depend on the captures (see _get_template_key)
+    TEMPLATES_CACHE_SIZE = 3
+    _templates = odict()
+
     def __init__(self, width, height, *images):
         assert len(images) in range(1, 5), "1 to 4 images can be concatenated"
         self._texts = []
@@ -252,8 +292,97 @@ class PictureFactory(object):
         """
         raise NotImplementedError
 
-    def _build_stripe_matrix(self, image):
-        offset_generator = self._iter_stripe_rects()
+    def _build_overlay(self):
+        """Create the overlay resized to the final image size.
+
+        :return: image object which depends on the child class implementation.
+        :rtype: object
+        """
+        raise NotImplementedError
+
+    def _get_template_key(self, layout):
+        """Return a hashable key representing all options used to pre-render
+        the template canvas (texts are not part of the key, because they
+        may change at each sequence, see :py:meth:`_get_texts_key`).
+
+        :param layout: captures layout MATRIX or STRIPE
+        :type layout: str
+        """
+        return (self.__class__.__name__, layout, self.width, self.height, len(self._images),
+                self._margin, self._margin_text, self._texts_height,
+                tuple(self._background_color), self._background_image, _get_mtime(self._background_image),
+                self._overlay_image, _get_mtime(self._overlay_image))
+
+    def _get_texts_key(self):
+        """Return a hashable key representing the texts to pre-render.
+        """
+        return tuple((text, font_name, tuple(color), align) for text, font_name, color, align in self._texts)
+
+    def _get_template(self, layout):
+        """Return the template for the given layout. The template is
+        built only if not already cached by a previous factory using the
+        same options.
+
+        :param layout: captures layout MATRIX or STRIPE
+        :type layout: str
+
+        :return: template instance
+        :rtype: :py:class:`PictureTemplate`
+        """
+        key = self._get_template_key(layout)
+        template = self._templates.pop(key, None)
+        if template:
+            LOGGER.debug("Use %s cached template", self.name)
+        else:
+            LOGGER.info("Use %s to create background", self.name)
+            background = self._build_background()
+
+            overlay = None
+            if self._overlay_image:
+                LOGGER.info("Use %s to create overlay", self.name)
+                overlay = self._build_overlay()
+
+            if layout == self.STRIPE:
+                rects = list(self._iter_stripe_rects())
+            else:
+                rects = list(self._iter_images_rects())
+            template = PictureTemplate(background, overlay, rects)
+
+        texts_key = self._get_texts_key()
+        if template.texts_key != texts_key:
+            LOGGER.info("Use %s to render texts", self.name)
+            template.texts = self._build_texts_masks()
+            template.texts_key = texts_key
+
+        self._templates[key] = template  # Most recently used at the end
+        while len(self._templates) > self.TEMPLATES_CACHE_SIZE:
+            self._templates.popitem(last=False)
+        return template
+
+    def _draft_images(self, rects):
+        """Configure the JPEG images not decoded yet to use the libjpeg DCT
+        scaling: they are decoded at the smallest size bigger than their slot.
+
+        :param rects: rectangles in which images are pasted
+        :type rects: list
+        """
+        resize_type = 'outer' if self._crop else 'inner'
+        for image, (_, _, max_w, max_h) in zip(self._images, rects):
+            if getattr(image, 'format', None) == 'JPEG' and image.tile:
+                image.draft(image.mode, sizing.new_size_keep_aspect_ratio(image.size, (max_w, max_h), resize_type))
+
+    def _build_stripe_matrix(self, image, rects):
+        """Draw the images stripe on the given image.
+
+        :param image: image object which depends on the child class implementation.
+        :type image: object
+        :param rects: rectangles in which images are pasted
+        :type rects: list
+
+        :return: image object which depends on the child class implementation.
+        :rtype: object
+        """
+        offset_generator = iter(rects)
         count = 1
         for src_image in self._iter_images():
             pos_x, pos_y, max_w, max_h = next(offset_generator)
@@ -274,16 +403,18 @@ class PictureFactory(object):
             count += 1
         return image
 
-    def _build_matrix(self, image):
+    def _build_matrix(self, image, rects):
         """Draw the images matrix on the given image.
 
         :param image: image object which depends on the child class implementation.
         :type image: object
+        :param rects: rectangles in which images are pasted
+        :type rects: list
 
         :return: image object which depends on the child class implementation.
         :rtype: object
         """
-        offset_generator = self._iter_images_rects()
+        offset_generator = iter(rects)
         count = 1
         for src_image in self._iter_images():
             pos_x, pos_y, max_w, max_h = next(offset_generator)
@@ -304,26 +435,28 @@ class PictureFactory(object):
             count += 1
         return image
 
-    def _build_final_image(self, image):
+    def _build_final_image(self, image, overlay):
         """Create the final PIL image and set it to the _final attribute.
 
         :param image: image object which depends on the child class implementation.
         :type image: object
+        :param overlay: overlay created by :py:meth:`_build_overlay` or None
+        :type overlay: object
 
         :return: PIL.Image instance
         :rtype: object
         """
         raise NotImplementedError
 
-    def _build_texts(self, image):
-        """Draw texts on a PIL image (PIL is used instead of OpenCV
+    def _build_texts_masks(self):
+        """Render each text in a mask (PIL is used instead of OpenCV
         because it is able to draw any fonts without ext).
 
-        :param image: PIL.Image instance
-        :type image: object
+        :return: list of (color, position, mask)
+        :rtype: list
         """
+        masks = []
         offset_generator = self._iter_texts_rects()
-        draw = ImageDraw.Draw(image)
         for text, font_name, color, align in self._texts:
             text_x, text_y, max_width, max_height = next(offset_generator)
             if not text:  # Empty string: go to next text position
@@ -337,9 +470,25 @@ class PictureFactory(object):
             elif align == self.RIGHT:
                 text_x += (max_width - text_width)
 
-            draw.text((text_x - offset_x // 2,
-                       text_y + (max_height - text_height) // 2 - offset_y // 2),
-                      text, color, font=font)
+            left, top, right, bottom = font.getbbox(text)
+            if right <= left or bottom <= top:
+                continue  # Nothing visible to draw
+            mask = Image.new('L', (right - left, bottom - top), 0)
+            ImageDraw.Draw(mask).text((-left, -top), text, 255, font=font)
+            masks.append((tuple(color), (text_x - offset_x // 2 + left,
+                                         text_y + (max_height - text_height) // 2 - offset_y // 2 + top), mask))
+        return masks
+
+    def _build_texts(self, image, masks):
+        """Draw texts on a PIL image.
+
+        :param image: PIL.Image instance
+        :type image: object
+        :param masks: texts rendered by :py:meth:`_build_texts_masks`
+        :type masks: list
+        """
+        for color, (pos_x, pos_y), mask in masks:
+            image.paste(color, (pos_x, pos_y, pos_x + mask.size[0], pos_y + mask.size[1]), mask)
 
 
     def _build_logo(self, image):
@@ -484,6 +633,15 @@ class PictureFactory(object):
         self._outlines = outlines
         self._final = None  # Force rebuild
 
+    def get_slot_size(self):
+        """Return the size of the biggest rectangle in which a capture is
+        pasted, without building anything.
+
+        :return: (width, height)
+        :rtype: tuple
+        """
+        rects = list(self._iter_images_rects())
+        return (max(rect[2] for rect in rects), max(rect[3] for rect in rects))
 
     def build_stripe(self, rebuild=False):
         """Build the final image or doas nothing if the final image
@@ -497,20 +655,20 @@ class PictureFactory(object):
         """
         if not self._final or rebuild:
 
-            LOGGER.info("Use %s to create background", self.name)
-            image = self._build_background()
+            template = self._get_template(self.STRIPE)
+            self._draft_images(template.rects)
 
             LOGGER.info("Use %s to concatenate images", self.name)
-            image = self._build_stripe_matrix(image)
+            image = self._build_stripe_matrix(template.background.copy(), template.rects)
 
             # LOGGER.info("Use %s todraw logo", self.name)
             #             # image = self._build_logo(image)
             #
             LOGGER.info("Use %s to assemble final image", self.name)
-            self._final = self._build_final_image(image)
+            self._final = self._build_final_image(image, template.overlay)
 
             LOGGER.info("Use %s to draw texts", self.name)
-            self._build_texts(self._final)
+            self._build_texts(self._final, template.texts)
 
             if self._outlines:
                 LOGGER.info("Use %s to outline boundary borders", self.name)
@@ -531,20 +689,20 @@ class PictureFactory(object):
         """
         if not self._final or rebuild:
 
-            LOGGER.info("Use %s to create background", self.name)
-            image = self._build_background()
+            template = self._get_template(self.MATRIX)
+            self._draft_images(template.rects)
 
             LOGGER.info("Use %s to concatenate images", self.name)
-            image = self._build_matrix(image)
+            image = self._build_matrix(template.background.copy(), template.rects)
 
             # LOGGER.info("Use %s to draw logo", self.name)
             # image = self._build_logo(image)
 
             LOGGER.info("Use %s to assemble final image", self.name)
-            self._final = self._build_final_image(image)
+            self._final = self._build_final_image(image, template.overlay)
 
             LOGGER.info("Use %s to draw texts", self.name)
-            self._build_texts(self._final)
+            self._build_texts(self._final, template.texts)
 
             if self._outlines:
                 LOGGER.info("Use %s to outline boundary borders", self.name)
@@ -604,16 +762,21 @@ class PilPictureFactory(PictureFactory):
         for image in self._images:
             yield image
 
-    def _build_final_image(self, image):
+    def _build_final_image(self, image, overlay):
         """See upper class description.
         """
-        if self._overlay_image:
-            overlay = Image.open(self._overlay_image).convert('RGBA')
-            overlay, _, _ = self._image_resize_keep_ratio(overlay, self.width, self.height, True)
+        if overlay is not None:
             image = Image.alpha_composite(image.convert('RGBA'), overlay)
             image = image.convert('RGB')
         return image
 
+    def _build_overlay(self):
+        """See upper class description.
+        """
+        overlay = Image.open(self._overlay_image).convert('RGBA')
+        overlay, _, _ = self._image_resize_keep_ratio(overlay, self.width, self.height, True)
+        return overlay
+
     def _build_background(self):
         """See upper class description.
         """
@@ -665,43 +828,37 @@ class OpenCvPictureFactory(PictureFactory):
         for image in self._images:
             yield np.array(image.convert('RGB'))
 
-    def _build_final_image(self, image):
+    def _build_final_image(self, image, overlay):
         """See upper class description.
         """
-        if self._overlay_image:
-            overlay = cv2.cvtColor(cv2.imread(self._overlay_image, cv2.IMREAD_UNCHANGED), cv2.COLOR_BGR2RGBA)
-            overlay, _, _ = self._image_resize_keep_ratio(overlay, self.width, self.height, True)
-
-            x, y = 0, 0
-            image_width = image.shape[1]
-            image_height = image.shape[0]
-
+        if overlay is not None:
             h, w = overlay.shape[0], overlay.shape[1]
-
-            if x + w > image_width:
-                w = image_width - x
-                overlay = overlay[:, :w]
-
-            if y + h > image_height:
-                h = image_height - y
-                overlay = overlay[:h]
-
-            if overlay.shape[2] < 4:
-                overlay = np.concatenate(
-                    [
-                        overlay,
-                        np.ones((overlay.shape[0], overlay.shape[1], 1), dtype=overlay.dtype) * 255
-                    ],
-                    axis=2,
-                )
-
             overlay_image = overlay[..., :3]
             mask = overlay[..., 3:] / 255.0
 
-            image[y:y+h, x:x+w] = (1.0 - mask) * image[y:y+h, x:x+w] + mask * overlay_image
+            image[:h, :w] = (1.0 - mask) * image[:h, :w] + mask * overlay_image
 
         return Image.fromarray(image)
 
+    def _build_overlay(self):
+        """See upper class description.
+        """
+        overlay = cv2.cvtColor(cv2.imread(self._overlay_image, cv2.IMREAD_UNCHANGED), cv2.COLOR_BGR2RGBA)
+        overlay, _, _ = self._image_resize_keep_ratio(overlay, self.width, self.height, True)
+
+        # Ensure the overlay does not exceed the final image size
+        overlay = overlay[:self.height, :self.width]
+
+        if overlay.shape[2] < 4:
+            overlay = np.concatenate(
+                [
+                    overlay,
+                    np.ones((overlay.shape[0], overlay.shape[1], 1), dtype=overlay.dtype) * 255
+                ],
+                axis=2,
+            )
+        return overlay
+
     def _build_background(self):
         """See upper class description.
         """
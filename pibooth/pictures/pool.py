@@ -1,25 +1,154 @@
 # -*- coding: utf-8 -*-
 
+import copy
+import time
 import multiprocessing
+from collections import deque
+from PIL import Image
+from pibooth.utils import LOGGER
+from pibooth.pictures import sizing
+
+
+# Maximum time in seconds to wait for a picture built by the pool
+BUILD_TIMEOUT = 60
+
+
+def _init_worker(factories):
+    """Called once at worker startup to pre-render the templates (backgrounds,
+    overlays and fonts) of the given factories.
+
+    The errors are only logged: a worker dying in its initializer would be
+    respawned endlessly by the pool (the error is raised again when the
+    picture is built).
+    """
+    for factory in factories:
+        try:
+            factory._get_template(factory.MATRIX)
+        except Exception as ex:
+            LOGGER.warning("Can not pre-render the picture template: %s", ex)
+
+
+def _build_factory(factory, size=None):
+    """Build the factory in a worker. Images given as file paths are
+    opened here to avoid sending the pixels through the pool pipe.
+    The built image is resized to fit in the given size if any.
+
+    :return: (image, duration in seconds)
+    :rtype: tuple
+    """
+    start = time.time()
+    factory._images = tuple(Image.open(image) if isinstance(image, str) else image
+                            for image in factory._images)
+    image = factory.build()
+    if size:
+        new_size = sizing.new_size_keep_aspect_ratio(image.size, size)
+        if image.size != new_size:
+            image = image.resize(new_size, Image.ANTIALIAS)
+    return image, time.time() - start
+
+
+def _save_factory(factory, path, stripe=False):
+    """Build the factory in a worker and save the image in the given file.
+
+    :return: duration in seconds
+    :rtype: float
+    """
+    start = time.time()
+    factory._images = tuple(Image.open(image) if isinstance(image, str) else image
+                            for image in factory._images)
+    if stripe:
+        factory.save_stripe(path)
+    else:
+        factory.save(path)
+    return time.time() - start
 
 
 class PicturesFactoryPool(object):
 
+    """Pool of long-lived processes used to build the pictures factories.
+
+    :attr timings: build duration (in seconds) of the last tasks
+    :type timings: :py:class:`collections.deque`
+    """
+
     def __init__(self):
         self._pool = None
         self._async_results = []
+        self._results = []
+        self.timings = deque(maxlen=50)
 
-    def add(self, factory):
+    def start(self, factories=()):
+        """Start the workers if not already done. The templates of the
+        given factories are pre-rendered in each worker.
+
+        :param factories: factories used to warm-up the workers
+        :type factories: list
+        """
+        if self._pool:
+            return
+        processes = min(multiprocessing.cpu_count(), 4)
+        LOGGER.debug("Start pictures factory pool with %s workers", processes)
+        self._pool = multiprocessing.Pool(processes=processes, initializer=_init_worker,
+                                          initargs=(tuple(factories),))
+
+    def add(self, factory, paths=None, size=None):
         """Add a new picture factory and build it asyncronously.
+
+        :param factory: factory to build
+        :type factory: :py:class:`pibooth.pictures.factory.PictureFactory`
+        :param paths: files of the factory's images (opened by the worker instead
+                      of sending the images to it)
+        :type paths: list
+        :param size: size in which the built image is resized (to be displayed
+                     without resizing it)
+        :type size: tuple
+        """
+        if not self._pool:
+            self.start()
+        if paths:
+            assert len(paths) == len(factory._images), "One path per factory image is expected"
+            factory = copy.copy(factory)
+            factory._images = tuple(paths)
+        self._async_results.append(self._pool.apply_async(_build_factory, (factory, size)))
+
+    def save(self, factory, path, paths=None, stripe=False):
+        """Build a factory and save the image in a file asyncronously. The
+        result is not part of the ones returned by :py:meth:`get`.
+
+        :param factory: factory to build
+        :type factory: :py:class:`pibooth.pictures.factory.PictureFactory`
+        :param path: file where the image is saved
+        :type path: str
+        :param paths: files of the factory's images (see :py:meth:`add`)
+        :type paths: list
+        :param stripe: build the image as a stripe
+        :type stripe: bool
+
+        :return: result giving the build duration when the file is written
+        :rtype: :py:class:`multiprocessing.pool.AsyncResult`
         """
         if not self._pool:
-            self._pool = multiprocessing.Pool(processes=min(multiprocessing.cpu_count(), 4))
-        self._async_results.append(self._pool.apply_async(factory.build))
+            self.start()
+        if paths:
+            assert len(paths) == len(factory._images), "One path per factory image is expected"
+            factory = copy.copy(factory)
+            factory._images = tuple(paths)
+        return self._pool.apply_async(_save_factory, (factory, path, stripe))
 
-    def get(self):
+    def get(self, timeout=BUILD_TIMEOUT):
         """Return all the results.
+
+        :param timeout: maximum time in seconds to wait for each result
+        :type timeout: float
+
+        :raise multiprocessing.TimeoutError: if a picture is not built in time
         """
-        return [res.get() for res in self._async_results]
+        while self._async_results:
+            image, duration = self._async_results.pop(0).get(timeout)
+            LOGGER.debug("Picture built by the pool in %0.3f seconds", duration)
+            self.timings.append(duration)
+            self._results.append(image)
+        return list(self._results)
 
     def clear(self):
         """Cancel all run tasks and drop all factories.
@@ -27,6 +156,7 @@ class PicturesFactoryPool(object):
         for res in self._async_results:
             res.get(5)
         self._async_results = []
+        self._results = []
 
     def quit(self):
         """Quit and cleanup the pool.
@@ -34,3 +164,4 @@ class PicturesFactoryPool(object):
         if self._pool:
             self._pool.terminate()
             self._pool.join()
+            self._pool = None
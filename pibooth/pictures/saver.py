@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import os.path as osp
+from concurrent import futures
+from PIL import Image
+from pibooth.utils import LOGGER
+
+
+def get_encoded_data(image, format='JPEG', **options):
+    """Return the bytes of the given image encoded in the given format.
+    If the image has a ``raw_data`` attribute (original bytes delivered by
+    the camera), those bytes are returned without re-encoding.
+
+    :param image: PIL image to encode
+    :type image: :py:class:`PIL.Image.Image`
+    :param format: PIL format name
+    :type format: str
+    :param options: options passed to the PIL encoder
+    :type options: dict
+
+    :return: encoded image
+    :rtype: bytes
+    """
+    data = getattr(image, 'raw_data', None)
+    if data is not None:
+        return data
+    buff = io.BytesIO()
+    image.save(buff, format, **options)
+    return buff.getvalue()
+
+
+class PicturesSaver(object):
+
+    """Save pictures to several destinations in background threads. Each
+    picture is encoded only one time, then the bytes are written to all
+    destinations concurrently.
+    """
+
+    def __init__(self, max_writers=4):
+        self._encoder = futures.ThreadPoolExecutor(max_workers=2)
+        self._writer = futures.ThreadPoolExecutor(max_workers=max_writers)
+        self._pending = []
+
+    def _write(self, data, path):
+        """Write bytes in the given file, create its directory if necessary.
+        """
+        dirname = osp.dirname(osp.abspath(path))
+        if not osp.isdir(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        LOGGER.info("Save image '%s'", path)
+        with open(path, 'wb') as fp:
+            fp.write(data)
+
+    def _save(self, image, paths, options):
+        """Encode the image and write it to all paths.
+        """
+        ext = osp.splitext(paths[0])[1].lower()
+        data = get_encoded_data(image, Image.registered_extensions().get(ext, 'JPEG'), **options)
+        writes = [self._writer.submit(self._write, data, path) for path in paths]
+        for write in writes:
+            write.result()  # Raise write errors
+
+    def save(self, image, paths, **options):
+        """Save asyncronously the image in all given files (the format is
+        guessed from the extension of the first one).
+
+        :param image: PIL image to save
+        :type image: :py:class:`PIL.Image.Image`
+        :param paths: list of files paths
+        :type paths: list
+        :param options: options passed to the PIL encoder
+        :type options: dict
+
+        :return: future which is done when the image is written in all files
+        :rtype: :py:class:`concurrent.futures.Future`
+        """
+        if not paths:
+            raise ValueError("At least one path is required to save the image")
+        future = self._encoder.submit(self._save, image, tuple(paths), options)
+        self._pending.append(future)
+        return future
+
+    def wait(self, timeout=None):
+        """Wait for all pending saves, errors are raised here.
+
+        :param timeout: maximum time to wait for each save in seconds
+        :type timeout: float
+        """
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result(timeout)
+
+    def quit(self):
+        """Wait for pending saves and stop the threads.
+        """
+        try:
+            self.wait()
+        finally:
+            self._encoder.shutdown()
+            self._writer.shutdown()
@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
 
 import inspect
+from collections import deque
 import pluggy
 
 from pibooth.utils import LOGGER, load_module
+from pibooth.profiler import Profiler
 from pibooth.plugins import hookspecs
 from pibooth.plugins.camera_plugin import CameraPlugin
 from pibooth.plugins.lights_plugin import LightsPlugin
@@ -13,6 +15,43 @@ from pibooth.plugins.printer_plugin import PrinterPlugin
 from pibooth.plugins.view_plugin import ViewPlugin
 
 
+# Number of last calls used to compute the statistics of a hook implementation
+STATS_SIZE = 100
+
+# Number of consecutive calls exceeding the budget before disabling a plugin
+BUDGET_STRIKES = 3
+
+
+class HookStats(object):
+
+    """Rolling statistics of the calls of a plugin hook implementation.
+
+    :attr durations: durations in seconds of the last calls
+    :type durations: :py:class:`collections.deque`
+    :attr over_budget: number of calls exceeding the budget
+    :type over_budget: int
+    :attr strikes: number of consecutive calls exceeding the budget
+    :type strikes: int
+    """
+
+    def __init__(self):
+        self.durations = deque(maxlen=STATS_SIZE)
+        self.over_budget = 0
+        self.strikes = 0
+
+    @property
+    def mean(self):
+        """Mean duration of the last calls in seconds.
+        """
+        return sum(self.durations) / len(self.durations) if self.durations else 0.
+
+    @property
+    def max(self):
+        """Maximum duration of the last calls in seconds.
+        """
+        return max(self.durations) if self.durations else 0.
+
+
 def create_plugin_manager():
     """Create plugin manager and defined hooks specification."""
     plugin_manager = PiPluginManager(hookspecs.hookspec.project_name)
@@ -25,6 +64,10 @@ class PiPluginManager(pluggy.PluginManager):
     def __init__(self, *args, **kwargs):
         super(PiPluginManager, self).__init__(*args, **kwargs)
         self._plugin2calls = {}
+        self.profiler = Profiler()
+        self.hook_stats = {}  # Statistics by (plugin name, hook name)
+        self._budget = 0
+        self._disable_slow = False
 
         def before(hook_name, methods, kwargs):
             """Keep the list of already called hook per plugin to know if a
@@ -32,9 +75,12 @@ class PiPluginManager(pluggy.PluginManager):
             """
             for hookimpl in methods:
                 self._plugin2calls[hookimpl.plugin].add(hook_name)
+            self.profiler.start()
 
         def after(outcome, hook_name, methods, kwargs):
-            pass
+            """Measure the duration of the hook call (all implementations).
+            """
+            self.profiler.stop('hook', hook_name)
 
         self.add_hookcall_monitoring(before, after)
 
@@ -45,8 +91,66 @@ class PiPluginManager(pluggy.PluginManager):
         plugin_name = super(PiPluginManager, self).register(plugin, name)
         if plugin not in self._plugin2calls:
             self._plugin2calls[plugin] = set()
+
+        # Measure the duration of each hook implementation of the plugin
+        # (hook wrappers are only measured with the whole hook call)
+        for hookcaller in self.get_hookcallers(plugin) or []:
+            for hookimpl in hookcaller.get_hookimpls():
+                if hookimpl.plugin is plugin and not hookimpl.hookwrapper\
+                        and not getattr(hookimpl, 'wrapper', False):
+                    hookimpl.function = self.profiler.wrap(hookimpl.function, hookcaller.name, plugin_name,
+                                                           self._on_hookimpl_called)
         return plugin_name
 
+    def set_hook_budget(self, budget, disable=False):
+        """Set the maximum duration of an external plugin ``state_*`` hook
+        call, a warning is logged each time it is exceeded.
+
+        :param budget: duration in seconds (0 for no budget)
+        :type budget: float
+        :param disable: unregister an external plugin exceeding the budget
+                        several times in a row
+        :type disable: bool
+        """
+        self._budget = budget
+        self._disable_slow = disable
+
+    def _on_hookimpl_called(self, hook_name, plugin_name, duration):
+        """Update the statistics of a plugin hook implementation and check
+        its budget.
+        """
+        stats = self.hook_stats.setdefault((plugin_name, hook_name), HookStats())
+        stats.durations.append(duration)
+        if not self._budget or not hook_name.startswith('state_'):
+            return
+        # Core plugins hooks may block by design (camera, picture building)
+        plugin = self.get_plugin(plugin_name)
+        if plugin not in self.list_external_plugins():
+            return
+        if duration <= self._budget:
+            stats.strikes = 0
+            return
+
+        stats.over_budget += 1
+        stats.strikes += 1
+        LOGGER.warning("Plugin '%s' exceeded its budget in '%s': %.0f ms > %.0f ms",
+                       plugin_name, hook_name, duration * 1000, self._budget * 1000)
+        if self._disable_slow and stats.strikes >= BUDGET_STRIKES:
+            LOGGER.error("Plugin '%s' disabled: budget exceeded %s times in a row",
+                         plugin_name, stats.strikes)
+            self.unregister(plugin)
+
+    def get_hook_stats(self, plugin):
+        """Return the statistics of the hook implementations of the given
+        plugin as a list of (hook name, :py:class:`HookStats`).
+
+        :param plugin: plugin object
+        :type plugin: object
+        """
+        name = self.get_name(plugin) or self.get_canonical_name(plugin)  # May be unregistered
+        return sorted([(hook_name, stats) for (plugin_name, hook_name), stats in self.hook_stats.items()
+                       if plugin_name == name])
+
     def load_all_plugins(self, paths, disabled=None):
         """Register the core plugins, load plugins from setuptools entry points
         and the load given module/package paths.
@@ -108,7 +212,7 @@ class PiPluginManager(pluggy.PluginManager):
         """Return the friendly name of the given plugin and
         optionally its version.
 
-        :param plugin: registered plugin object
+        :param plugin: plugin object
         :type plugin: object
         :param version: include the version number
         :type version: bool
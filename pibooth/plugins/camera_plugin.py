@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import time
+import os.path as osp
 import pygame
 import pibooth
 from pibooth import camera
@@ -25,13 +26,23 @@ class CameraPlugin(object):
 
         if not cam:
             LOGGER.debug("Fallback to pibooth default camera management system")
-            cam = camera.find_camera()
+            filename = cfg.join_path('last_camera')
+            last_camera = None
+            if osp.isfile(filename):
+                with open(filename) as fp:
+                    last_camera = fp.read().strip()
+            cam = camera.find_camera(last_camera)
+            if cam.__class__.__name__ != last_camera:
+                with open(filename, 'w') as fp:
+                    fp.write(cam.__class__.__name__)
 
         cam.initialize(cfg.gettuple('CAMERA', 'iso', (int, str), 2),
                        cfg.gettyped('CAMERA', 'resolution'),
                        cfg.gettuple('CAMERA', 'rotation', int, 2),
                        cfg.getboolean('CAMERA', 'flip'),
-                       cfg.getboolean('CAMERA', 'delete_internal_memory'))
+                       cfg.getboolean('CAMERA', 'delete_internal_memory'),
+                       raw_passthrough=cfg.getboolean('CAMERA', 'raw_passthrough'),
+                       captures_folders=cfg.gettuple('CAMERA', 'captures_folders', str))
         outcome.force_result(cam)
 
     @pibooth.hookimpl
@@ -4,10 +4,12 @@ import os
 import os.path as osp
 import itertools
 from datetime import datetime
+from PIL import Image
 import pibooth
 from pibooth.utils import LOGGER, PoolingTimer
 from pibooth.pictures import get_picture_factory
 from pibooth.pictures.pool import PicturesFactoryPool
+from pibooth.pictures.saver import PicturesSaver
 
 
 class PicturePlugin(object):
@@ -17,9 +19,13 @@ class PicturePlugin(object):
 
     name = 'pibooth-core:picture'
 
+    # Paper size in inches of the final picture
+    paper_format = (4, 6)
+
     def __init__(self, plugin_manager):
         self._pm = plugin_manager
         self.factory_pool = PicturesFactoryPool()
+        self.saver = PicturesSaver()
         self.picture_destroy_timer = PoolingTimer(0)
         self.second_previous_picture = None
         self.texts_vars = {}
@@ -64,9 +70,45 @@ class PicturePlugin(object):
 
         outcome.force_result(factory)
 
+    def _get_factory(self, cfg, opt_index, captures):
+        """Return the factory used to build the final picture.
+        """
+        default_factory = get_picture_factory(captures, cfg.get('PICTURE', 'orientation'),
+                                              paper_format=self.paper_format)
+        return self._pm.hook.pibooth_setup_picture_factory(cfg=cfg,
+                                                           opt_index=opt_index,
+                                                           factory=default_factory)
+
+    def _get_animation_factory(self, cfg, opt_index, capture):
+        """Return the factory used to build one frame of the animation.
+        """
+        default_factory = get_picture_factory((capture,), cfg.get(
+            'PICTURE', 'orientation'), paper_format=self.paper_format, force_pil=True, dpi=200)
+        factory = self._pm.hook.pibooth_setup_picture_factory(cfg=cfg,
+                                                              opt_index=opt_index,
+                                                              factory=default_factory)
+        factory.set_margin(factory._margin // 3)  # 1/3 since DPI is divided by 3
+        return factory
+
+    @pibooth.hookimpl
+    def pibooth_startup(self, cfg, app):
+        factories = []
+        if cfg.getboolean('WINDOW', 'animate'):
+            self.texts_vars['date'] = datetime.now()
+            self.texts_vars['count'] = app.count
+            # Small capture with the camera aspect ratio, only the template is pre-rendered
+            resolution = cfg.gettyped('CAMERA', 'resolution')
+            capture = Image.new('RGB', (resolution[0] // 10, resolution[1] // 10))
+            for idx, nbr in enumerate(app.capture_choices):
+                if nbr > 1:
+                    factories.append(self._get_animation_factory(cfg, idx, capture))
+        LOGGER.info("Start the pictures factory pool")
+        self.factory_pool.start(factories)
+
     @pibooth.hookimpl
     def pibooth_cleanup(self):
         self.factory_pool.quit()
+        self.saver.quit()
 
     @pibooth.hookimpl
     def state_failsafe_enter(self, app):
@@ -91,13 +133,24 @@ class PicturePlugin(object):
                 and app.previous_picture_file:
             self._reset_vars(app)
 
+    @pibooth.hookimpl
+    def state_preview_enter(self, cfg, app):
+        # Negotiate the slot size with the camera before the captures are
+        # downloaded, to decode smaller captures if possible
+        self.texts_vars['date'] = datetime.now()
+        self.texts_vars['count'] = app.count
+        idx = app.capture_choices.index(app.capture_nbr)
+        resolution = cfg.gettyped('CAMERA', 'resolution')
+        placeholder = Image.new('RGB', (resolution[0] // 10, resolution[1] // 10))
+        app.camera.set_slot_size(self._get_factory(cfg, idx, (placeholder,) * app.capture_nbr).get_slot_size())
+
     @pibooth.hookimpl
     def state_processing_enter(self, app):
         self.second_previous_picture = app.previous_picture
         self._reset_vars(app)
 
     @pibooth.hookimpl
-    def state_processing_do(self, cfg, app):
+    def state_processing_do(self, cfg, app, win):
         idx = app.capture_choices.index(app.capture_nbr)
         self.texts_vars['date'] = datetime.strptime(app.capture_date, "%Y-%m-%d-%H-%M-%S")
         self.texts_vars['count'] = app.count
@@ -105,35 +158,40 @@ class PicturePlugin(object):
         LOGGER.info("Saving raw captures")
         captures = app.camera.get_captures()
 
-        for savedir in cfg.gettuple('GENERAL', 'directory', 'path'):
-            rawdir = osp.join(savedir, "raw", app.capture_date)
-            os.makedirs(rawdir)
-
-            for capture in captures:
-                count = captures.index(capture)
-                capture.save(osp.join(rawdir, "{:03}{}.jpg".format(count, cfg.gettyped('PICTURE', 'pic_postfix'))))
+        savedirs = cfg.gettuple('GENERAL', 'directory', 'path')
+        raw_paths = []
+        for count, capture in enumerate(captures):
+            filename = "{:03}{}.jpg".format(count, cfg.gettyped('PICTURE', 'pic_postfix'))
+            paths = [osp.join(savedir, "raw", app.capture_date, filename) for savedir in savedirs]
+            self.saver.save(capture, paths)
+            raw_paths.append(paths[0])
 
         LOGGER.info("Creating the final picture")
-        default_factory = get_picture_factory(captures, cfg.get('PICTURE', 'orientation'))
-        factory = self._pm.hook.pibooth_setup_picture_factory(cfg=cfg,
-                                                              opt_index=idx,
-                                                              factory=default_factory)
+        factory = self._get_factory(cfg, idx, captures)
         app.previous_picture = factory.build()
 
-        for savedir in cfg.gettuple('GENERAL', 'directory', 'path'):
-            app.previous_picture_file = osp.join(savedir, app.picture_filename)
-            factory.save(app.previous_picture_file)
+        paths = [osp.join(savedir, app.picture_filename) for savedir in savedirs]
+        self.saver.save(app.previous_picture, paths)
+        app.previous_picture_file = paths[-1]
+
+        # Files shall be written before being printed or read by the pool
+        self.saver.wait()
+
+        # Render the page to print before the animation frames
+        app.printer.prepare_file(app.previous_picture_file, cfg.getint('PRINTER', 'pictures_per_page'),
+                                 self.factory_pool)
 
         if cfg.getboolean('WINDOW', 'animate') and app.capture_nbr > 1:
             LOGGER.info("Asyncronously generate pictures for animation")
-            for capture in captures:
-                default_factory = get_picture_factory((capture,), cfg.get(
-                    'PICTURE', 'orientation'), force_pil=True, dpi=200)
-                factory = self._pm.hook.pibooth_setup_picture_factory(cfg=cfg,
-                                                                      opt_index=idx,
-                                                                      factory=default_factory)
-                factory.set_margin(factory._margin // 3)  # 1/3 since DPI is divided by 3
-                self.factory_pool.add(factory)
+            # Frames are displayed in the wait state, pre-scale them in the workers
+            size = win.get_foreground_size()
+            for capture, raw_path in zip(captures, raw_paths):
+                factory = self._get_animation_factory(cfg, idx, capture)
+                if getattr(capture, 'raw_data', None) and not capture.format:
+                    # Raw file is the original camera file, not the processed capture
+                    self.factory_pool.add(factory, size=size)
+                else:
+                    self.factory_pool.add(factory, (raw_path,), size)
 
     @pibooth.hookimpl
     def state_processing_exit(self, app):
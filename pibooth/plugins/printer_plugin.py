@@ -18,7 +18,6 @@ class PrinterPlugin(object):
         LOGGER.info("Send final picture to printer")
         app.printer.print_file(app.previous_picture_file,
                                cfg.getint('PRINTER', 'pictures_per_page'))
-        app.count.printed += 1
         app.count.remaining_duplicates -= 1
 
     @pibooth.hookimpl
@@ -9,7 +9,13 @@ try:
 except ImportError:
     cups = None  # CUPS is optional
 
+import os
+import re
+import time
+import queue
+import shutil
 import tempfile
+import threading
 import os.path as osp
 
 import pygame
@@ -20,6 +26,23 @@ from pibooth.pictures import get_picture_factory, get_stripe_factory
 
 PRINTER_TASKS_UPDATED = pygame.USEREVENT + 2
 
+# Routing of the print jobs when several printers are used
+ROUTING_LEAST_LOADED = 'least-loaded'
+ROUTING_ROUND_ROBIN = 'round-robin'
+
+# Value of the 'printer-state' attribute of a stopped printer
+PRINTER_STATE_STOPPED = 5
+
+# Job states which can be moved to another printer (pending, held, stopped)
+MOVABLE_JOB_STATES = (3, 4, 6)
+
+# Key and state (IPP 'pending-held') of the stripe held to be printed with the next one
+HELD_JOB_ID = 'held'
+HELD_JOB_STATE = 4
+
+# Maximum time to wait for a pre-rendered page in seconds
+PRERENDER_TIMEOUT = 60
+
 PAPER_FORMATS = {
     '2x6': (2, 6),      # 2x6 pouces - 5x15 cm - 51x152 mm Stripes
     '3,5x5': (3.5, 5),  # 3,5x5 pouces - 9x13 cm - 89x127 mm
@@ -30,12 +53,104 @@ PAPER_FORMATS = {
 }
 
 
+# Resolution and paper format used if the native ones are unknown
+DEFAULT_DPI = 600
+DEFAULT_PAPER_FORMAT = (4, 6)
+
+
+def parse_resolution(value):
+    """Return the resolution in dot-per-inch from an IPP resolution tuple
+    (x, y, units) or a PPD resolution choice ('300dpi', '300x300dpi').
+    Return None if it can not be parsed.
+    """
+    if isinstance(value, (tuple, list)) and len(value) == 3:
+        xres, _yres, units = value
+        return int(round(xres * 2.54)) if units == 4 else int(xres)  # 4 = dots per cm
+    match = re.match(r'^(\d+)(?:x\d+)?dpi$', str(value))
+    return int(match.group(1)) if match else None
+
+
+def parse_media(value):
+    """Return the paper format in inches from a PWG media name (for
+    instance 'na_index-4x6_4x6in' or 'iso_a6_105x148mm'). Return None
+    if it can not be parsed.
+    """
+    match = re.search(r'_(\d+(?:\.\d+)?)x(\d+(?:\.\d+)?)(in|mm)$', str(value))
+    if not match:
+        return None
+    ratio = 1. if match.group(3) == 'in' else 25.4
+    return (float(match.group(1)) / ratio, float(match.group(2)) / ratio)
+
+
+def get_print_factory(picture, copies=1, paper_format=DEFAULT_PAPER_FORMAT, dpi=DEFAULT_DPI, pair=None):
+    """Return the factory used to render a page with the given number of
+    copies of the picture. With one copy, the page is a stripe with the
+    picture duplicated (to be cut in the middle).
+
+    :param picture: picture to print
+    :type picture: :py:class:`PIL.Image`
+    :param copies: number of copies of the picture on the page
+    :type copies: int
+    :param paper_format: paper size in inches
+    :type paper_format: tuple
+    :param dpi: dot-per-inche resolution
+    :type dpi: int
+    :param pair: picture printed next to the stripe instead of a duplicate
+    :type pair: :py:class:`PIL.Image`
+    """
+    # Don't call setup factory hook here, as the selected parameters
+    # are the one necessary to render several pictures on same page.
+    if copies > 1:
+        factory = get_picture_factory((picture,) * copies, paper_format=paper_format, dpi=dpi)
+        factory.set_margin(2)
+    else:
+        factory = get_stripe_factory((pair or picture, picture), paper_format=paper_format, dpi=dpi)
+        factory.set_margin(0)
+    return factory
+
+
 class Printer(object):
 
+    """Interface to the CUPS server.
+
+    Once the printer is found, the CUPS connection is only used by a
+    service thread: the requests (print, cancel) are queued and the jobs
+    of the printer are kept in an in-memory table refreshed on each CUPS
+    notification. Thus a slow or hung CUPS server never blocks the caller.
+
+    Several printers (CUPS queues) can be given: each page is sent to the
+    least loaded one (or in turn, see :py:attr:`routing`), the stopped
+    printers are skipped and their pending jobs moved to another one. The
+    pages printed by each printer are counted in ``printed_<name>``
+    counters to check its paper/ink level.
+
+    :param name: name of the printer or list of names
+    :type name: str or list
+    """
+
     def __init__(self, name='default', max_pages=-1, options=None, counters=None):
         self._conn = cups.Connection() if cups else None
         self._notifier = Subscriber(self._conn) if cups else None
+        self._requests = queue.Queue()
+        self._refresh = threading.Event()
+        self._jobs = {}
+        self._last_event = None
+        self._jobs_lock = threading.Lock()
+        self._thread = None
+        self._tmpdir = None
+        self._prepared = {}  # Pre-rendered pages by (filename, copies)
+        self._stopped = set()
+        self._pending = dict()  # Pages queued by printer but not yet sent
+        self._last_routed = None
+        self._route_lock = threading.Lock()
+        self._held = None  # (filename, deadline) of the stripe waiting for a pair
+        self._held_lock = threading.Lock()
         self.name = None
+        self.names = []
+        self.routing = ROUTING_LEAST_LOADED
+        self.batch_delay = 0
+        self.native = False
+        self.native_format = None  # (paper format, dpi) queried from CUPS
         self.max_pages = max_pages
         self.options = options
         self.count = counters
@@ -43,20 +158,30 @@ class Printer(object):
             LOGGER.warning("No printer found (pycups or pycups-notify not installed)")
             return  # CUPS is not installed
 
-        if not name or name.lower() == 'default':
-            self.name = self._conn.getDefault()
-            if not self.name and self._conn.getPrinters():
-                self.name = list(self._conn.getPrinters().keys())[0]  # Take first one
-        elif name in self._conn.getPrinters():
-            self.name = name
-
-        if not self.name:
-            if name.lower() == 'default':
-                LOGGER.warning("No printer configured in CUPS (see http://localhost:631)")
+        printers = self._conn.getPrinters()
+        for name in ([name] if isinstance(name, str) or not name else name):
+            found = None
+            if not name or name.lower() == 'default':
+                found = self._conn.getDefault()
+                if not found and printers:
+                    found = list(printers.keys())[0]  # Take first one
+                if not found:
+                    LOGGER.warning("No printer configured in CUPS (see http://localhost:631)")
+            elif name in printers:
+                found = name
             else:
                 LOGGER.warning("No printer named '%s' in CUPS (see http://localhost:631)", name)
-        else:
-            LOGGER.info("Connected to printer '%s'", self.name)
+
+            if found and found not in self.names:
+                LOGGER.info("Connected to printer '%s'", found)
+                self.names.append(found)
+                self._pending[found] = 0
+
+        if self.names:
+            self.name = self.names[0]
+        if len(self.names) > 1 and self.count is not None:
+            for name in self.names:
+                self.count.setdefault(self._get_counter_name(name), 0)
 
         if self.options and not isinstance(self.options, dict):
             LOGGER.warning("Invalid printer options '%s', dict is expected", self.options)
@@ -64,12 +189,181 @@ class Printer(object):
         elif not self.options:
             self.options = {}
 
+        if self.name:
+            self._thread = threading.Thread(target=self._run, name='PrinterService', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """Process the queued requests and refresh the jobs table (service
+        thread, the only one using the CUPS connection once started).
+        """
+        self._call(self._query_native_format)
+        self._call(self._notifier.subscribe, self._on_event, [event.CUPS_EVT_JOB_COMPLETED,
+                                                              event.CUPS_EVT_JOB_CREATED,
+                                                              event.CUPS_EVT_JOB_STOPPED,
+                                                              event.CUPS_EVT_PRINTER_STATE_CHANGED,
+                                                              event.CUPS_EVT_PRINTER_STOPPED])
+        self._refresh.set()
+        while True:
+            try:
+                request = self._requests.get(timeout=0.1)
+            except queue.Empty:
+                request = ()
+            if request is None:
+                break  # Quit requested
+            if request:
+                self._call(*request)
+            self._release_held(timeout=True)
+            if self._refresh.is_set() and self._requests.empty():
+                self._refresh.clear()
+                self._refresh_jobs()
+
+    def _call(self, function, *args, **kwargs):
+        """Call a function of the CUPS connection, errors are logged.
+        """
+        try:
+            return function(*args, **kwargs)
+        except Exception as ex:
+            LOGGER.error("CUPS request '%s' failed: %s", function.__name__, ex)
+            return None
+
+    def _query_native_format(self):
+        """Read the resolution and the media size of the printer from its
+        IPP attributes (or its PPD file for the resolution).
+        """
+        attrs = self._conn.getPrinterAttributes(self.name, requested_attributes=[
+            'printer-resolution-default', 'media-default', 'print-color-mode-default'])
+        dpi = parse_resolution(attrs.get('printer-resolution-default'))
+        if not dpi:
+            filename = self._conn.getPPD(self.name)
+            try:
+                option = cups.PPD(filename).findOption('Resolution')
+                dpi = parse_resolution(option.defchoice) if option else None
+            finally:
+                os.remove(filename)
+        paper_format = parse_media(attrs.get('media-default'))
+        if dpi and paper_format:
+            self.native_format = (paper_format, dpi)
+            LOGGER.info("Printer '%s' native format: %sx%s inches at %s dpi (%s)", self.name,
+                        paper_format[0], paper_format[1], dpi, attrs.get('print-color-mode-default', 'color'))
+        else:
+            LOGGER.warning("Printer '%s' native format unknown (resolution=%s, media=%s)", self.name,
+                           dpi, attrs.get('media-default'))
+
+    def _get_print_factory(self, picture, copies, pair=None):
+        """Return the factory used to render the page (see :py:attr:`native`).
+        """
+        if self.native and self.native_format:
+            return get_print_factory(picture, copies, *self.native_format, pair=pair)
+        return get_print_factory(picture, copies, pair=pair)
+
+    def _get_print_extension(self, filename):
+        """Return the extension of the rendered page file.
+        """
+        if self.native and self.native_format:
+            # Lossless and at the printer size: passed through by the CUPS filters
+            return '.png'
+        return osp.splitext(filename)[1]
+
+    def _refresh_jobs(self):
+        """Read the jobs and the state of the printers from the CUPS server
+        and notify the application.
+        """
+        jobs = self._call(self._conn.getJobs, my_jobs=True, requested_attributes=["job-id", "job-name",
+                                                                                  "job-uri", "job-state",
+                                                                                  "job-printer-uri"])
+        printers = self._call(self._conn.getPrinters)
+        if jobs is None or printers is None:
+            return
+
+        stopped = set(name for name in self.names if name not in printers
+                      or printers[name].get('printer-state') == PRINTER_STATE_STOPPED
+                      or not printers[name].get('printer-is-accepting-jobs', True))
+        for name in stopped - self._stopped:
+            LOGGER.warning("Printer '%s' is stopped", name)
+        for name in self._stopped - stopped:
+            LOGGER.info("Printer '%s' is available again", name)
+        with self._jobs_lock:
+            self._jobs = jobs
+            self._stopped = stopped
+
+        self._move_jobs()
+        pygame.event.post(pygame.event.Event(PRINTER_TASKS_UPDATED, evt=self._last_event))
+
+    def _move_jobs(self):
+        """Move the pending jobs of the stopped printers to the available
+        ones.
+        """
+        with self._jobs_lock:
+            jobs = dict(self._jobs)
+        for job_id, attrs in jobs.items():
+            name = self._get_job_printer(attrs)
+            if name in self._stopped and attrs.get('job-state') in MOVABLE_JOB_STATES:
+                target = self._select_printer()
+                if not target:
+                    return  # No printer available
+                LOGGER.warning("Move job %s from stopped printer '%s' to '%s'", job_id, name, target)
+                uri = attrs['job-printer-uri'][:-len(name)] + target
+                try:
+                    self._conn.moveJob(job_id=job_id, job_printer_uri=uri)
+                except Exception as ex:
+                    LOGGER.error("Can not move job %s: %s", job_id, ex)
+                    continue
+                with self._jobs_lock:
+                    self._jobs[job_id] = dict(attrs, **{'job-printer-uri': uri})
+
+    def _get_job_printer(self, attrs):
+        """Return the name of the printer of a job.
+        """
+        return attrs.get('job-printer-uri', '').rsplit('/', 1)[-1]
+
+    def _get_counter_name(self, name):
+        """Return the name of the counter of the pages printed by a printer.
+        """
+        return 'printed_' + name
+
+    def _is_full(self, name):
+        """Return True if paper/ink counter of the given printer is reached.
+        """
+        if self.max_pages < 0 or self.count is None:  # No limit
+            return False
+        if len(self.names) == 1:
+            return self.count.printed >= self.max_pages
+        return self.count[self._get_counter_name(name)] >= self.max_pages
+
+    def _select_printer(self):
+        """Return the printer to which the next page is sent (None if no
+        printer is available).
+        """
+        available = self.get_available_printers()
+        if not available:
+            return None
+        # Next printers in turn after the last used one
+        if self._last_routed in self.names:
+            index = self.names.index(self._last_routed) + 1
+            order = self.names[index:] + self.names[:index]
+        else:
+            order = self.names
+        available.sort(key=order.index)
+        if self.routing == ROUTING_ROUND_ROBIN:
+            return available[0]
+
+        loads = dict((name, self._pending[name]) for name in available)
+        with self._jobs_lock:
+            jobs = list(self._jobs.values())
+        for attrs in jobs:
+            name = self._get_job_printer(attrs)
+            if name in loads:
+                loads[name] += 1
+        return min(available, key=lambda name: loads[name])  # First one in turn if equal
+
     def _on_event(self, evt):
         """
         Call for each new printer event.
         """
         LOGGER.info(evt.title)
-        pygame.event.post(pygame.event.Event(PRINTER_TASKS_UPDATED, evt=evt))
+        self._last_event = evt
+        self._refresh.set()
 
     def is_installed(self):
         """Return True if the CUPS server is available for printing.
@@ -81,65 +375,174 @@ class Printer(object):
         """
         if not self.is_installed():
             return False
-        if self.max_pages < 0 or self.count is None:  # No limit
-            return True
-        return self.count.printed < self.max_pages
+        return any(not self._is_full(name) for name in self.names)
+
+    def get_available_printers(self):
+        """Return the names of the printers neither stopped nor having their
+        paper/ink counter reached.
+        """
+        with self._jobs_lock:
+            stopped = set(self._stopped)
+        return [name for name in self.names if name not in stopped and not self._is_full(name)]
+
+    def prepare_file(self, filename, copies, pool):
+        """Render in background the page to print for the given file, thus
+        :py:meth:`print_file` has only to send it to the CUPS server. The
+        pages pre-rendered for a previous file are removed.
+
+        :param filename: file of the picture to print
+        :type filename: str
+        :param copies: number of copies of the picture on the page
+        :type copies: int
+        :param pool: pool used to render the page
+        :type pool: :py:class:`pibooth.pictures.pool.PicturesFactoryPool`
+        """
+        if not self.is_installed() or (filename, copies) in self._prepared:
+            return
+        for key, (path, _result) in list(self._prepared.items()):
+            if key[0] != filename:
+                # Removed by the service thread, after the pending prints
+                self._requests.put((self._remove_file, path))
+                del self._prepared[key]
+
+        if not self._tmpdir:
+            self._tmpdir = tempfile.mkdtemp(prefix='pibooth-print-')
+        with Image.open(filename) as picture:
+            # Only the header is read, the pool opens the file from its path
+            factory = self._get_print_factory(picture, copies)
+        name = osp.splitext(osp.basename(filename))[0]
+        path = osp.join(self._tmpdir, "{}_{}{}".format(name, copies, self._get_print_extension(filename)))
+        result = pool.save(factory, path, (filename,) * len(factory._images), copies == 1)
+        self._prepared[(filename, copies)] = (path, result)
 
     def print_file(self, filename, copies=1):
-        """Send a file to the CUPS server to the default printer.
+        """Send a file to the CUPS server to the default printer. The
+        ``printed`` counter is incremented for each page sent.
         """
         if not self.name:
             raise EnvironmentError("No printer found (check config file or CUPS config)")
         if not osp.isfile(filename):
             raise IOError("No such file or directory: {}".format(filename))
-        if self._notifier and not self._notifier.is_subscribed(self._on_event):
-            self._notifier.subscribe(self._on_event, [event.CUPS_EVT_JOB_COMPLETED,
-                                                      event.CUPS_EVT_JOB_CREATED,
-                                                      event.CUPS_EVT_JOB_STOPPED,
-                                                      event.CUPS_EVT_PRINTER_STATE_CHANGED,
-                                                      event.CUPS_EVT_PRINTER_STOPPED])
-
-        if copies > 1:
-            with tempfile.NamedTemporaryFile(suffix=osp.basename(filename)) as fp:
-                picture = Image.open(filename)
-                factory = get_picture_factory((picture,) * copies)
-                # Don't call setup factory hook here, as the selected parameters
-                # are the one necessary to render several pictures on same page.
-                factory.set_margin(2)
-                factory.save(fp.name)
-                self._conn.printFile(self.name, fp.name, osp.basename(filename), self.options)
+        if copies == 1 and self.batch_delay > 0:
+            with self._held_lock:
+                held, self._held = self._held, None
+                if not held:
+                    LOGGER.info("Hold stripe '%s' %s seconds to print it with the next one",
+                                filename, self.batch_delay)
+                    self._held = (filename, time.time() + self.batch_delay)
+                    self._refresh.set()  # Notify the held stripe
+                    return
+            LOGGER.info("Print stripes '%s' and '%s' on the same page", held[0], filename)
+            self._submit(filename, copies, held[0])
         else:
-            # stripe feature
-            with tempfile.NamedTemporaryFile(suffix=osp.basename(filename)) as fp:
-                picture = Image.open(filename)
-                factory = get_stripe_factory((picture,) * 2)
-                # Don't call setup factory hook here, as the selected parameters
-                # are the one necessary to render several pictures on same page.
-                factory.set_margin(0)
-                factory.save_stripe(fp.name)
-                self._conn.printFile(self.name, fp.name, osp.basename(filename), self.options)
-
-            # self._conn.printFile(self.name, filename, osp.basename(filename), self.options)
-        LOGGER.debug("File '%s' sent to the printer with options %s", filename, self.options)
+            self._submit(filename, copies)
+
+    def _release_held(self, timeout=False):
+        """Print the held stripe alone (duplicated on the page).
+
+        :param timeout: only if its batching delay is over
+        :type timeout: bool
+        """
+        with self._held_lock:
+            if not self._held or (timeout and time.time() < self._held[1]):
+                return
+            filename, self._held = self._held[0], None
+        LOGGER.info("No stripe to print with '%s', print it alone", filename)
+        self._submit(filename, 1)
+
+    def _submit(self, filename, copies, pair=None):
+        """Choose the printer and queue the page to be sent to the CUPS
+        server.
+        """
+        with self._route_lock:
+            name = self._select_printer() or self.name  # Queued by CUPS if none available
+            self._last_routed = name
+            with self._jobs_lock:
+                self._pending[name] += 1
+            if self.count is not None:
+                # Paper is counted per page (two stripes may share a page)
+                self.count.printed += 1
+                if len(self.names) > 1:
+                    counter = self._get_counter_name(name)
+                    setattr(self.count, counter, self.count[counter] + 1)
+        prepared = self._prepared.get((filename, copies)) if not pair else None
+        self._requests.put((self._print_file, filename, copies, name, prepared, pair))
+        self._refresh.set()
+
+    def _print_file(self, filename, copies, name, prepared=None, pair=None):
+        """Send the page to the CUPS server, it is rendered here if it has
+        not been pre-rendered (service thread).
+        """
+        try:
+            if prepared:
+                path, result = prepared
+                try:
+                    LOGGER.debug("Page pre-rendered in %0.3f seconds", result.get(PRERENDER_TIMEOUT))
+                    self._conn.printFile(name, path, osp.basename(filename), self.options)
+                    LOGGER.debug("File '%s' sent to the printer '%s' with options %s", filename, name, self.options)
+                    return
+                except Exception as ex:
+                    LOGGER.warning("Page of '%s' not pre-rendered, render it now (%s)", filename, ex)
+
+            pictures = [Image.open(path) for path in (filename, pair) if path]
+            try:
+                factory = self._get_print_factory(pictures[0], copies, pictures[1] if pair else None)
+                with tempfile.NamedTemporaryFile(suffix=self._get_print_extension(filename)) as fp:
+                    if copies > 1:
+                        factory.save(fp.name)
+                    else:
+                        factory.save_stripe(fp.name)  # stripe feature
+                    self._conn.printFile(name, fp.name, osp.basename(filename), self.options)
+            finally:
+                for picture in pictures:
+                    picture.close()
+            LOGGER.debug("File '%s' sent to the printer '%s' with options %s", filename, name, self.options)
+        finally:
+            with self._jobs_lock:
+                self._pending[name] -= 1
+
+    def _remove_file(self, path):
+        """Remove a pre-rendered page (service thread).
+        """
+        if osp.isfile(path):
+            os.remove(path)
 
     def cancel_all_tasks(self):
-        """Cancel all tasks in the queue.
+        """Cancel all tasks in the queues.
         """
         if not self.name:
             raise EnvironmentError("No printer found (check config file or CUPS config)")
-        self._conn.cancelAllJobs(self.name)
+        with self._held_lock:
+            self._held = None
+        for name in self.names:
+            self._requests.put((self._conn.cancelAllJobs, name))
+        self._refresh.set()
 
     def get_all_tasks(self):
         """Return a dict (indexed by job ID) of dicts representing all tasks
-        in the queue.
+        in the queue (as known at the last CUPS notification). The stripe
+        waiting for the next one is included with :py:data:`HELD_JOB_ID`.
         """
-        if not self.name:
-            return {}  # No printer found
-        return self._conn.getJobs(my_jobs=True, requested_attributes=["job-id", "job-name",
-                                                                      "job-uri", "job-state"])
+        with self._jobs_lock:
+            tasks = dict(self._jobs)
+        with self._held_lock:
+            if self._held:
+                tasks[HELD_JOB_ID] = {'job-name': osp.basename(self._held[0]), 'job-state': HELD_JOB_STATE}
+        return tasks
 
     def quit(self):
         """Do cleanup actions.
         """
+        if self._thread:
+            self._release_held()  # Don't forget the held stripe
+            self._requests.put(None)
+            self._thread.join(5)
+            if self._thread.is_alive():
+                LOGGER.warning("CUPS server not responding, printer service thread abandoned")
+            self._thread = None
         if self._notifier:
             self._notifier.unsubscribe_all()
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
+        self._prepared = {}
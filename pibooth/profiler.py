@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth timings profiler.
+
+The durations of the states, of the hooks and of each plugin hook
+implementation are accumulated in histograms. They are written in the
+log file (debug level) each time a state is left, the ``pibooth-profile``
+command summarizes them.
+"""
+
+import json
+import time
+import threading
+from pibooth.utils import LOGGER
+
+
+# Tag of the log lines containing profiling data
+PROFILE_TAG = 'PROFILE'
+
+# Upper bounds of the histograms buckets in seconds (last bucket is unbounded)
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1., 2., 5., 10., 30., 60.)
+
+
+class Histogram(object):
+
+    """Cumulative histogram of durations.
+
+    :attr counts: number of durations in each bucket
+    :type counts: list
+    :attr total: sum of the durations in seconds
+    :type total: float
+    :attr max: maximum duration in seconds
+    :type max: float
+    """
+
+    def __init__(self, counts=None, total=0., max=0.):
+        self.counts = list(counts or [0] * (len(BUCKETS) + 1))
+        self.total = total
+        self.max = max
+
+    @property
+    def count(self):
+        """Number of durations.
+        """
+        return sum(self.counts)
+
+    def add(self, duration):
+        """Add a duration.
+
+        :param duration: duration in seconds
+        :type duration: float
+        """
+        index = 0
+        while index < len(BUCKETS) and duration > BUCKETS[index]:
+            index += 1
+        self.counts[index] += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    def merge(self, other):
+        """Add the durations of another histogram.
+        """
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent):
+        """Return the upper bound of the bucket containing the given
+        percentile (the maximum duration if it is in the last bucket).
+
+        :param percent: percentile from 0 to 100
+        :type percent: float
+        """
+        threshold = self.count * percent / 100.
+        cumulated = 0
+        for index, count in enumerate(self.counts):
+            cumulated += count
+            if count and cumulated >= threshold:
+                if index < len(BUCKETS):
+                    return min(BUCKETS[index], self.max)
+                return self.max
+        return 0.
+
+    def to_dict(self):
+        return {'counts': self.counts, 'total': self.total, 'max': self.max}
+
+
+class Profiler(object):
+
+    """Collect the durations by kind ('state', 'hook' or 'plugin'), name
+    and plugin.
+
+    :attr histograms: cumulated histograms by (kind, name, plugin)
+    :type histograms: dict
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self._unlogged = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def add(self, kind, name, duration, plugin=None):
+        """Add a duration.
+
+        :param kind: 'state', 'hook' or 'plugin'
+        :type kind: str
+        :param name: name of the state or hook
+        :type name: str
+        :param duration: duration in seconds
+        :type duration: float
+        :param plugin: name of the plugin for 'plugin' kind
+        :type plugin: str
+        """
+        key = (kind, name, plugin)
+        with self._lock:
+            self.histograms.setdefault(key, Histogram()).add(duration)
+            self._unlogged.setdefault(key, Histogram()).add(duration)
+
+    def start(self):
+        """Start measuring a (possibly nested) hook call in this thread.
+        """
+        self._local.__dict__.setdefault('starts', []).append(time.time())
+
+    def stop(self, kind, name, plugin=None):
+        """Stop measuring the last started call and add its duration.
+        """
+        self.add(kind, name, time.time() - self._local.starts.pop(), plugin)
+
+    def wrap(self, function, name, plugin, callback=None):
+        """Return the function wrapped to measure its duration.
+
+        :param callback: function called with (name, plugin, duration)
+                         after each call
+        :type callback: callable
+        """
+        def profiled(*args, **kwargs):
+            start = time.time()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                duration = time.time() - start
+                self.add('plugin', name, duration, plugin)
+                if callback:
+                    callback(name, plugin, duration)
+        profiled.__wrapped__ = function
+        return profiled
+
+    def log(self):
+        """Write in the log the durations added since the last call.
+        """
+        with self._lock:
+            unlogged, self._unlogged = self._unlogged, {}
+        for (kind, name, plugin), histogram in sorted(unlogged.items(), key=lambda item: str(item[0])):
+            data = dict(kind=kind, name=name, plugin=plugin, **histogram.to_dict())
+            LOGGER.debug("%s %s", PROFILE_TAG, json.dumps(data))
+
+
+def parse_log(lines):
+    """Return the histograms by (kind, name, plugin) read from the lines
+    of a log file.
+
+    :param lines: lines of the log file
+    :type lines: iterable
+    """
+    histograms = {}
+    tag = PROFILE_TAG + ' '
+    for line in lines:
+        if tag not in line:
+            continue
+        try:
+            data = json.loads(line[line.index(tag) + len(tag):])
+            histogram = Histogram(data['counts'], data['total'], data['max'])
+        except (ValueError, KeyError):
+            continue  # Truncated line
+        key = (data['kind'], data['name'], data['plugin'])
+        histograms.setdefault(key, Histogram()).merge(histogram)
+    return histograms
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""Pibooth main loop frame scheduler.
+"""
+
+import time
+import pygame
+from pibooth.utils import LOGGER, PoolingTimer
+
+
+class StateStats(object):
+
+    """Frames and CPU time spent in a state.
+
+    :attr frames: number of frames processed
+    :type frames: int
+    :attr duration: wall time spent in seconds
+    :type duration: float
+    :attr cpu_time: CPU time used by the process in seconds
+    :type cpu_time: float
+    """
+
+    def __init__(self):
+        self.frames = 0
+        self.duration = 0.
+        self.cpu_time = 0.
+
+    @property
+    def fps(self):
+        """Effective frame rate.
+        """
+        return self.frames / self.duration if self.duration else 0.
+
+    @property
+    def cpu_load(self):
+        """Part of the wall time used by the CPU (can be greater than 1
+        with threads on several cores).
+        """
+        return self.cpu_time / self.duration if self.duration else 0.
+
+
+class FrameScheduler(object):
+
+    """Pace the main loop: at full rate in the states displaying a
+    live content (preview, countdown), else sleep until something has
+    to be done: an event is posted (pygame, GPIO buttons, printer
+    notifications) or a :py:class:`PoolingTimer` times out.
+
+    :attr stats: statistics per state name
+    :type stats: dict
+    """
+
+    def __init__(self, fps=40, busy_states=('preview', 'capture'), max_sleep=1.):
+        self.fps = fps
+        self.busy_states = busy_states
+        self.max_sleep = max_sleep
+        self.stats = {}
+        self._clock = pygame.time.Clock()
+        self._event = None
+        self._state = None
+        self._wall_time = time.time()
+        self._cpu_time = time.process_time()
+
+    def _get_sleep_time(self):
+        """Return the time to sleep before the next known deadline.
+        """
+        timeout = PoolingTimer.next_timeout()
+        if timeout is None:
+            return self.max_sleep
+        # Never run faster than the full rate
+        return min(max(timeout, 1. / self.fps), self.max_sleep)
+
+    def _account(self, state):
+        """Add the time spent since the last call to the given state.
+        """
+        now, cpu = time.time(), time.process_time()
+        stats = self.stats.setdefault(state, StateStats())
+        stats.frames += 1
+        stats.duration += now - self._wall_time
+        stats.cpu_time += cpu - self._cpu_time
+        self._wall_time, self._cpu_time = now, cpu
+
+        if state != self._state:
+            if self._state in self.stats:
+                stats = self.stats[self._state]
+                LOGGER.debug("State '%s': %.1f FPS, %.0f%% CPU", self._state, stats.fps, stats.cpu_load * 100)
+            self._state = state
+
+    def get_events(self):
+        """Return the events received since the last frame.
+        """
+        events = list(pygame.event.get())
+        if self._event:
+            events.insert(0, self._event)
+            self._event = None
+        return events
+
+    def tick(self, state):
+        """Wait until the next frame has to be processed.
+
+        :param state: name of the active state
+        :type state: str
+        """
+        if state in self.busy_states or pygame.event.peek():
+            self._clock.tick(self.fps)
+        else:
+            # Wake up on the first event, keep it for the next frame
+            event = pygame.event.wait(int(self._get_sleep_time() * 1000))
+            if event.type != pygame.NOEVENT:
+                self._event = event
+            self._clock.tick()  # Keep the clock for the next full rate frame
+        self._account(state)
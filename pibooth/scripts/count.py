@@ -18,7 +18,7 @@ def main():
     plugin_manager = create_plugin_manager()
     config = PiConfigParser("~/.config/pibooth/pibooth.cfg", plugin_manager)
 
-    counters = Counters(config.join_path("counters.pickle"),
+    counters = Counters(config.join_path("counters.db"),
                         taken=0, printed=0, forgotten=0,
                         remaining_duplicates=config.getint('PRINTER', 'max_duplicates'))
 
@@ -33,6 +33,7 @@ def main():
                     setattr(counters, name, int(value))
         except KeyboardInterrupt:
             pass
+        counters.close()
         print()
     else:
         print("\nListing current counters:\n")
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+"""Script to summarize the timings of a pibooth session.
+"""
+
+import os.path as osp
+import argparse
+from pibooth.profiler import parse_log
+
+
+def main():
+    """Application entry point.
+    """
+    parser = argparse.ArgumentParser(usage="%(prog)s [options]",
+                                     description="Summarize the timings of a pibooth session log")
+    parser.add_argument("log", nargs='?', default="~/.config/pibooth/pibooth.log",
+                        help=u"path to the session log file (default: %(default)s)")
+    parser.add_argument("--kind", choices=('startup', 'state', 'hook', 'plugin'),
+                        help=u"show only the given kind of timings")
+    options = parser.parse_args()
+
+    filename = osp.abspath(osp.expanduser(options.log))
+    with open(filename) as fp:
+        histograms = parse_log(fp)
+
+    if not histograms:
+        print("No profiling data in '{}' (pibooth shall log at debug level in file)".format(filename))
+        return
+
+    print("\n{:<8} {:<32} {:<24} {:>7} {:>9} {:>9} {:>9} {:>9}".format(
+        "Kind", "Name", "Plugin", "Count", "p50 (ms)", "p95 (ms)", "Max (ms)", "Total (s)"))
+    print("-" * 114)
+    for (kind, name, plugin), histogram in sorted(histograms.items(), key=lambda item: str(item[0])):
+        if options.kind and kind != options.kind:
+            continue
+        print("{:<8} {:<32} {:<24} {:>7} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.2f}".format(
+            kind, name, plugin or '', histogram.count, histogram.percentile(50) * 1000,
+            histogram.percentile(95) * 1000, histogram.max * 1000, histogram.total))
+    print()
+
+
+if __name__ == "__main__":
+    main()
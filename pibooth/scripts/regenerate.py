@@ -82,7 +82,7 @@ def main():
     # Initialize varibales normally done by the app
     picture_plugin = plugin_manager.get_plugin('pibooth-core:picture')
     picture_plugin.texts_vars['date'] = datetime.now()
-    picture_plugin.texts_vars['count'] = Counters(config.join_path("counters.pickle"), taken=0, printed=0, forgotten=0,
+    picture_plugin.texts_vars['count'] = Counters(config.join_path("counters.db"), taken=0, printed=0, forgotten=0,
                                                   remaining_duplicates=config.getint('PRINTER', 'max_duplicates'))
 
     for path in config.gettuple('GENERAL', 'directory', 'path'):
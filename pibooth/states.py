@@ -77,6 +77,8 @@ class StateMachine(object):
                 hook(cfg=self.cfg, app=self.app, win=self.win)
                 BlockConsoleHandler.dedent()
                 LOGGER.debug("took %0.3f seconds", time.time() - self._start_time)
+                self.pm.profiler.add('state', self.active_state, time.time() - self._start_time)
+                self.pm.profiler.log()
         except Exception as ex:
             if self.failsafe_state and self.active_state != self.failsafe_state:
                 LOGGER.error(str(ex))
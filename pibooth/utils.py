@@ -13,6 +13,9 @@ import platform
 from fnmatch import fnmatchcase
 import contextlib
 import errno
+import importlib
+import threading
+import weakref
 import subprocess
 import pygame
 
@@ -69,6 +72,9 @@ class PoolingTimer(object):
     Timer to be used in a pooling loop to check if timeout has been exceed.
     """
 
+    # Started timers, used to know when the pooling loop has something to do
+    _started = weakref.WeakSet()
+
     def __init__(self, timeout, start=True):
         self.timeout = timeout
         self.time = None
@@ -87,6 +93,7 @@ class PoolingTimer(object):
         """Stop timer if used as context manager.
         """
         self.time = None
+        PoolingTimer._started.discard(self)
 
     def reset(self):
         """Reset timer to its initial state.
@@ -94,6 +101,7 @@ class PoolingTimer(object):
         self.time = None
         self._paused_total = 0
         self._paused_time = None
+        PoolingTimer._started.discard(self)
 
     def start(self):
         """Start the timer.
@@ -106,6 +114,7 @@ class PoolingTimer(object):
         else:
             self._paused_total = 0
             self.time = time.time()
+        PoolingTimer._started.add(self)
 
     def freeze(self):
         """Pause the timer.
@@ -145,6 +154,85 @@ class PoolingTimer(object):
             raise RuntimeError("PoolingTimer has never been started")
         return (time.time() - self.time - self.paused()) > self.timeout
 
+    @classmethod
+    def next_timeout(cls):
+        """Return the number of seconds before the next timeout of the
+        running timers (paused and already timed out timers are ignored),
+        None if there is no running timer.
+        """
+        remaining = [timer.remaining() for timer in list(cls._started)
+                     if timer.time is not None and not timer._paused_time]
+        remaining = [value for value in remaining if value > 0]
+        if remaining:
+            return min(remaining)
+        return None
+
+
+class LazyModule(object):
+
+    """Optional module imported at first use (some modules like OpenCV are
+    slow to import on a Raspberry Pi). The instance evaluates to False if
+    the module is not installed.
+
+    :param name: name of the module
+    :type name: str
+    """
+
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+        self.__loaded = False
+        self.__lock = threading.Lock()
+
+    def __load(self):
+        with self.__lock:
+            if not self.__loaded:
+                try:
+                    self.__module = importlib.import_module(self.__name)
+                except ImportError:
+                    self.__module = None
+                self.__loaded = True
+        return self.__module
+
+    def __bool__(self):
+        return self.__load() is not None
+
+    def __getattr__(self, attr):
+        if attr.startswith('_LazyModule__'):
+            raise AttributeError(attr)  # Instance not initialized
+        module = self.__load()
+        if module is None:
+            raise ImportError("No module named '{}'".format(self.__name))
+        return getattr(module, attr)
+
+
+class StepTimer(object):
+
+    """Measure the duration of successive steps (used to report the
+    startup timings).
+    """
+
+    def __init__(self, start=None):
+        self.start = start or time.time()
+        self.steps = []
+        self._last = self.start
+
+    def step(self, name):
+        """End the current step.
+
+        :param name: name of the step
+        :type name: str
+        """
+        now = time.time()
+        self.steps.append((name, now - self._last))
+        self._last = now
+
+    def report(self):
+        """Return a one line report of the steps durations.
+        """
+        return ", ".join(["{} {:.2f}s".format(name, duration) for name, duration in self.steps]
+                         + ["total {:.2f}s".format(self._last - self.start)])
+
 
 def configure_logging(level=logging.INFO, msgfmt=logging.BASIC_FORMAT, datefmt=None, filename=None):
     """Configure root logger for console printing.
@@ -229,14 +317,17 @@ def pkill(pattern):
     :param pattern: pattern used to match processes
     :type pattern: str
     """
-    for proc in psutil.process_iter():
-        if fnmatchcase(proc.name(), pattern):
-            LOGGER.debug("Try to kill process '%s'", proc.name())
+    # Process names are read in one pass, don't query each process again
+    for proc in psutil.process_iter(['name']):
+        if proc.info['name'] and fnmatchcase(proc.info['name'], pattern):
+            LOGGER.debug("Try to kill process '%s'", proc.info['name'])
             try:
                 proc.kill()
+            except psutil.NoSuchProcess:
+                pass  # Already dead
             except psutil.AccessDenied:
                 raise EnvironmentError("Can not kill '{}', root access is required. "
-                                       "(kill it manually before starting pibooth)".format(proc.name()))
+                                       "(kill it manually before starting pibooth)".format(proc.info['name']))
 
 
 def open_text_editor(filename):
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+
+"""Retained-mode rendering of the window: the elements displayed are
+described by layers, only the areas of the layers which have changed
+since the last rendering are repainted and pushed to the display.
+"""
+
+import pygame
+
+
+class Layer(object):
+
+    """Element of the window stacked above the previously added ones.
+
+    :attr key: hashable value describing the content, None if hidden
+    :type key: object
+    :attr rect: area covered by the layer on the window
+    :type rect: :py:class:`pygame.Rect`
+    :attr surface: surface blitted at the top-left of the rectangle if no
+                   specific paint function is defined
+    :type surface: :py:class:`pygame.Surface`
+    :attr opaque: True if the layer hides all pixels of the layers below
+    :type opaque: bool
+    """
+
+    def __init__(self, name, paint=None):
+        self.name = name
+        self._paint = paint
+        self.key = None
+        self.rect = None
+        self.surface = None
+        self.opaque = False
+        self.shown = (None, None)  # (key, rect) at last rendering
+
+    def is_visible(self):
+        """Return True if the layer has something to display.
+        """
+        return self.key is not None and self.rect is not None
+
+    def paint(self, surface):
+        """Paint the layer on the given surface (clipping area is already
+        set by the compositor).
+        """
+        if self._paint:
+            self._paint(surface)
+        elif self.surface:
+            surface.blit(self.surface, self.rect.topleft)
+
+
+class Compositor(object):
+
+    """Compose the layers on the window surface.
+
+    The layers are only described when the view changes (see
+    :py:meth:`set_layer`), the painting is done by :py:meth:`render`
+    for the areas which have changed, and :py:meth:`flip` pushes them
+    to the display.
+    """
+
+    def __init__(self, color=(0, 0, 0)):
+        self.color = color  # Color of the areas not covered by an opaque layer
+        self._layers = []
+        self._invalid = []
+        self._pending = []
+
+    def add_layer(self, name, paint=None):
+        """Add a new layer at the top of the stack.
+
+        :param name: name of the layer
+        :type name: str
+        :param paint: function called with the surface to paint the layer
+        :type paint: callable
+        """
+        if self.get_layer(name):
+            raise ValueError("Layer '{}' already exists".format(name))
+        layer = Layer(name, paint)
+        self._layers.append(layer)
+        return layer
+
+    def get_layer(self, name):
+        """Return the layer with the given name or None if not found.
+        """
+        for layer in self._layers:
+            if layer.name == name:
+                return layer
+        return None
+
+    def set_layer(self, name, key, rect, surface=None, opaque=False):
+        """Describe the content of a layer, the layer is created at the top
+        of the stack if it does not exist. Nothing is repainted if the key
+        and the rectangle are the same than at last rendering.
+
+        :param name: name of the layer
+        :type name: str
+        :param key: hashable value describing the content
+        :type key: object
+        :param rect: area covered by the layer
+        :type rect: :py:class:`pygame.Rect`
+        :param surface: surface to display (if no paint function)
+        :type surface: :py:class:`pygame.Surface`
+        :param opaque: the layer hides all pixels of the layers below
+        :type opaque: bool
+        """
+        layer = self.get_layer(name) or self.add_layer(name)
+        layer.key = key
+        layer.rect = pygame.Rect(rect) if rect is not None else None
+        layer.surface = surface
+        layer.opaque = opaque
+        return layer
+
+    def hide_layer(self, name):
+        """Hide the given layer, the content below will be repainted.
+        """
+        layer = self.get_layer(name)
+        if layer:
+            layer.key = layer.rect = layer.surface = None
+
+    def hide_layers_above(self, name):
+        """Hide all layers stacked above the given one.
+        """
+        layer = self.get_layer(name)
+        for above in self._layers[self._layers.index(layer) + 1:]:
+            above.key = above.rect = above.surface = None
+
+    def invalidate(self, rect=None):
+        """Force repainting the given area (all the window if None) at next
+        rendering.
+
+        :param rect: area to repaint
+        :type rect: :py:class:`pygame.Rect`
+        """
+        self._invalid.append(pygame.Rect(rect) if rect is not None else None)
+
+    def _get_dirty_rects(self, surface):
+        """Return the list of areas to repaint, overlapping areas are merged.
+        """
+        screen = surface.get_rect()
+        rects = [screen if rect is None else rect for rect in self._invalid]
+        self._invalid = []
+        for layer in self._layers:
+            current = (layer.key, layer.rect) if layer.is_visible() else (None, None)
+            if current != layer.shown:
+                rects.extend(rect for rect in (layer.shown[1], current[1]) if rect)
+                layer.shown = current
+
+        merged = []
+        for rect in rects:
+            rect = rect.clip(screen)
+            if not rect.width or not rect.height:
+                continue
+            index = rect.collidelist(merged)
+            while index >= 0:
+                rect.union_ip(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def render(self, surface):
+        """Repaint the areas which have changed since the last rendering.
+        Return the list of repainted rectangles.
+
+        :param surface: surface on which layers are painted
+        :type surface: :py:class:`pygame.Surface`
+        """
+        rects = self._get_dirty_rects(surface)
+        clip = surface.get_clip()
+        for rect in rects:
+            layers = [layer for layer in self._layers
+                      if layer.is_visible() and layer.rect.colliderect(rect)]
+            # Don't paint the layers hidden by an opaque one
+            for index in range(len(layers) - 1, -1, -1):
+                if layers[index].opaque and layers[index].rect.contains(rect):
+                    layers = layers[index:]
+                    break
+            else:
+                layers.insert(0, None)
+
+            surface.set_clip(rect)
+            for layer in layers:
+                if layer is None:
+                    surface.fill(self.color)
+                else:
+                    layer.paint(surface)
+        surface.set_clip(clip)
+        self._pending.extend(rect for rect in rects if rect not in self._pending)
+        return rects
+
+    def flip(self, full=False):
+        """Push the areas repainted since the last call to the display.
+
+        :param full: push the whole surface whatever the areas repainted
+        :type full: bool
+        """
+        if full:
+            pygame.display.update()
+        elif self._pending:
+            pygame.display.update(self._pending)
+        self._pending = []
@@ -5,12 +5,15 @@
 
 import os
 import time
+import weakref
 import contextlib
+from collections import OrderedDict
 import pygame
 from pygame import gfxdraw
 from PIL import Image
 from pibooth import pictures, fonts
 from pibooth.view import background
+from pibooth.view.compositor import Compositor
 from pibooth.utils import LOGGER
 from pibooth.pictures import sizing
 
@@ -38,6 +41,9 @@ class PiWindow(object):
     BOTTOM_LEFT = 'bottom_left'
     FULLSCREEN = 'fullscreen'
 
+    # Number of foreground images kept converted (final picture, animation frames)
+    SURFACES_CACHE_SIZE = 8
+
     def __init__(self, title,
                  size=(800, 480),
                  color=(0, 0, 0),
@@ -68,12 +74,24 @@ class PiWindow(object):
         self.surface = pygame.display.set_mode(self.__size, pygame.RESIZABLE)
 
         self._buffered_images = {}
+        self._surfaces = OrderedDict()
         self._current_background = None
         self._current_foreground = None
         self._print_number = 0
         self._print_failure = False
+        self._print_queues = None  # (available printers, printers)
         self._capture_number = (0, 4)  # (current, max)
 
+        self._background_version = 0
+        self._foreground_pos = None
+        self._foreground_outlines = None
+        self._compositor = Compositor()
+        self._compositor.add_layer('background', self._paint_background)
+        self._compositor.add_layer('captures', self._paint_capture_number)
+        self._compositor.add_layer('printer')
+        self._compositor.add_layer('flash', lambda surface: surface.fill((255, 255, 255)))
+        self._compositor.add_layer('foreground', self._paint_foreground)
+
         self._pos_map = {self.CENTER: self._center_pos,
                          self.RIGHT: self._right_pos,
                          self.LEFT: self._left_pos,
@@ -91,49 +109,94 @@ class PiWindow(object):
                         (192, 0, 224, 0, 240, 0, 248, 0, 252, 0, 254, 0, 255, 0, 255,
                          128, 255, 192, 255, 224, 254, 0, 239, 0, 207, 0, 135, 128, 7, 128, 3, 0))
 
-    def _update_foreground(self, pil_image, pos=CENTER, resize=True):
-        """Show a PIL image on the foreground.
-        Only one is bufferized to avoid memory leak.
+    def _get_foreground_layer(self, pos, resize):
+        """Return the name of the layer used to display a foreground image.
+        Images shown as it (no resize) are stacked by position to keep
+        several ones visible (preview and countdown for instance).
         """
-        image_name = id(pil_image)
+        if resize:
+            return 'foreground'
+        return 'image_{}'.format(pos)
+
+    def get_foreground_size(self, pos=CENTER):
+        """Return the maximum size of a resized foreground image displayed
+        at the given position. Images can be pre-scaled to this size to
+        avoid resizing them when displayed.
 
+        :param pos: position of the image
+        :type pos: str
+        """
         if pos == self.FULLSCREEN:
             if self.orientation == "portrait":
                 # todo check in fullscreen portrait monitor
-                image_size_max = (self.surface.get_size()[0] * 0.9, self.surface.get_size()[1] * 0.9)
-            else:
-                image_size_max = (self.surface.get_size()[0] * 0.9, self.surface.get_size()[1] * 0.9)
-        else:
-            if self.orientation == "portrait":
-                image_size_max = (self.surface.get_size()[0] * 0.48, self.surface.get_size()[1] * 0.48)
-            else:
-                image_size_max = (self.surface.get_size()[0] * 0.48, self.surface.get_size()[1] )
+                return (self.surface.get_size()[0] * 0.9, self.surface.get_size()[1] * 0.9)
+            return (self.surface.get_size()[0] * 0.9, self.surface.get_size()[1] * 0.9)
+        if self.orientation == "portrait":
+            return (self.surface.get_size()[0] * 0.48, self.surface.get_size()[1] * 0.48)
+        return (self.surface.get_size()[0] * 0.48, self.surface.get_size()[1])
+
+    def _get_surface(self, pil_image, size, resize=True):
+        """Return the pygame surface of a PIL image resized to fit in the
+        given size. The last converted images are kept in a LRU cache.
+        """
+        if isinstance(pil_image, pygame.Surface):
+            return pil_image  # Already converted (preview frames)
+
+        # Only a weak reference on the (possibly full resolution) image is
+        # kept, it checks that the id has not been reused by another image
+        key = (id(pil_image), size, resize)
+        if key in self._surfaces and self._surfaces[key][0]() is pil_image:
+            self._surfaces.move_to_end(key)
+            return self._surfaces[key][1]
+
+        image = pil_image
+        if resize:
+            new_size = sizing.new_size_keep_aspect_ratio(pil_image.size, size)
+            if pil_image.size != new_size:  # Not pre-scaled
+                image = pil_image.resize(new_size, Image.ANTIALIAS)
+        surface = pygame.image.frombuffer(image.tobytes(), image.size, image.mode)
+
+        LOGGER.debug("Add to cache the image '%s'", id(pil_image))
+        self._surfaces[key] = (weakref.ref(pil_image), surface)
+        self._surfaces.move_to_end(key)
+        while len(self._surfaces) > self.SURFACES_CACHE_SIZE:
+            self._surfaces.popitem(last=False)
+        return surface
 
-        buff_size, buff_image = self._buffered_images.get(image_name, (None, None))
-        if buff_image and image_size_max == buff_size:
-            image = buff_image
-        else:
-            if resize:
-                image = pil_image.resize(sizing.new_size_keep_aspect_ratio(
-                    pil_image.size, image_size_max), Image.ANTIALIAS)
-            else:
-                image = pil_image
-
-            image = pygame.image.frombuffer(image.tobytes(), image.size, image.mode)
-            if self._current_foreground:
-                self._buffered_images.pop(id(self._current_foreground[0]), None)
-            LOGGER.debug("Add to buffer the image '%s'", image_name)
-            self._buffered_images[image_name] = (image_size_max, image)
+    def _update_foreground(self, pil_image, pos=CENTER, resize=True):
+        """Show a PIL image on the foreground.
+        """
+        image_size_max = self.get_foreground_size(pos)
+        image = self._get_surface(pil_image, image_size_max, resize)
 
         self._current_foreground = (pil_image, pos, resize)
 
+        rect = self._pos_map[pos](image)
+        opaque = not image.get_flags() & pygame.SRCALPHA and image.get_alpha() in (None, 255)\
+            and image.get_colorkey() is None
         if self.debug and resize:
             # Build rectangle around picture area for debuging purpose
             outlines = pygame.Surface(image_size_max, pygame.SRCALPHA, 32)
             pygame.draw.rect(outlines, pygame.Color(255, 0, 0), outlines.get_rect(), 2)
-            self.surface.blit(outlines, self._pos_map[pos](outlines))
-
-        return self.surface.blit(image, self._pos_map[pos](image))
+            outlines_rect = self._pos_map[pos](outlines)
+            self._foreground_outlines = (outlines, outlines_rect)
+            rect = rect.union(outlines_rect)
+            opaque = False
+        elif resize:
+            self._foreground_outlines = None
+
+        if resize:
+            self._foreground_pos = self._pos_map[pos](image).topleft
+        # Use the surface as key: an id may be reused by a new image
+        self._compositor.set_layer(self._get_foreground_layer(pos, resize),
+                                   (image, image_size_max), rect, image, opaque)
+
+    def _paint_foreground(self, surface):
+        """Paint the resized foreground image (and its outlines).
+        """
+        if self._foreground_outlines:
+            surface.blit(*self._foreground_outlines)
+        surface.blit(self._compositor.get_layer('foreground').surface, self._foreground_pos)
 
     def _update_background(self, bkgd):
         """Show image on the background.
@@ -143,33 +206,56 @@ class PiWindow(object):
         self._current_background.set_outlines(self.debug)
         self._current_background.set_text_color(self.text_color)
         self._current_background.resize(self.surface)
-        self._current_background.paint(self.surface)
+        if self._current_background._need_update:
+            self._background_version += 1
+        self._compositor.set_layer('background', (id(self._current_background), self._background_version),
+                                   self.get_rect(), opaque=True)
+        # Changing the background clears the images, caller has to show them again
+        self._compositor.hide_layers_above('flash')
         self._update_capture_number()
         self._update_print_number()
 
+    def _paint_background(self, surface):
+        """Paint the current background.
+        """
+        self._current_background.paint(surface)
+
     def _update_capture_number(self):
         """Update the captures counter displayed.
         """
         if not self._capture_number[0]:
+            self._compositor.hide_layer('captures')
             return  # Dont show counter: no picture taken
 
+        radius = 30
+        border = 40
+        width = 2 * radius * self._capture_number[1] + border * (self._capture_number[1] - 1)
+        rect = pygame.Rect(0, 0, width + 2, 2 * radius + 2)
+        rect.center = (self.surface.get_rect().centerx, self.surface.get_size()[1] - radius - border)
+        self._compositor.set_layer('captures', (self._capture_number, self.text_color), rect)
+
+    def _paint_capture_number(self, surface):
+        """Paint the captures counter.
+        """
         center = self.surface.get_rect().center
         radius = 30
         border = 40
         x = center[0] - (2 * radius * self._capture_number[1] + border * (self._capture_number[1] - 1)) // 2
         y = self.surface.get_size()[1] - radius - border
         for nbr in range(self._capture_number[1]):
-            gfxdraw.aacircle(self.surface, x, y, radius, self.text_color)
+            gfxdraw.aacircle(surface, x, y, radius, self.text_color)
             if self._capture_number[0] > nbr:
                 # Because anti-aliased filled circle doesn't exist
-                gfxdraw.aacircle(self.surface, x, y, radius - 5, self.text_color)
-                gfxdraw.filled_circle(self.surface, x, y, radius - 5, self.text_color)
+                gfxdraw.aacircle(surface, x, y, radius - 5, self.text_color)
+                gfxdraw.filled_circle(surface, x, y, radius - 5, self.text_color)
             x += (2 * radius + border)
 
     def _update_print_number(self):
         """Update the number of files in the printer queue.
         """
-        if not self._print_number and not self._print_failure:
+        degraded = self._print_queues and self._print_queues[0] < self._print_queues[1]
+        if not self._print_number and not self._print_failure and not degraded:
+            self._compositor.hide_layer('printer')
             return  # Dont show counter: no file in queue, no failure
 
         smaller = self.surface.get_size()[1] if self.surface.get_size(
@@ -177,24 +263,43 @@ class PiWindow(object):
         side = int(smaller * 0.05)  # 5% of the window
 
         if side > 0:
-            if self._print_failure:
-                image = pictures.get_pygame_image('printer_failure.png', (side, side), color=self.text_color)
+            key = (self._print_number, self._print_failure, self._print_queues, side, self.text_color,
+                   self._current_background.get_color(), fonts.CURRENT)
+            layer = self._compositor.get_layer('printer')
+            if layer.key == key:
+                rect = layer.rect
+                bg = layer.surface
             else:
-                image = pictures.get_pygame_image('printer.png', (side, side), color=self.text_color)
-            font = pygame.font.Font(fonts.CURRENT, side)
-            label = font.render(str(self._print_number), True, self.text_color)
-
-            height = max((image.get_rect().height, label.get_rect().height)) + 20
-            bg = pygame.Surface((image.get_rect().width + label.get_rect().width + side + 10, height))
-            bg.fill(self._current_background.get_color())
-            rect = bg.get_rect()
+                if self._print_failure:
+                    image = pictures.get_pygame_image('printer_failure.png', (side, side), color=self.text_color)
+                else:
+                    image = pictures.get_pygame_image('printer.png', (side, side), color=self.text_color)
+                font = pygame.font.Font(fonts.CURRENT, side)
+                text = str(self._print_number)
+                if degraded:
+                    text += " ({}/{})".format(*self._print_queues)
+                label = font.render(text, True, self.text_color)
+
+                height = max((image.get_rect().height, label.get_rect().height)) + 20
+                bg = pygame.Surface((image.get_rect().width + label.get_rect().width + side + 10, height))
+                bg.fill(self._current_background.get_color())
+                rect_image = image.get_rect(left=10, centery=bg.get_rect().centery)
+                rect_label = label.get_rect(centerx=rect_image.right + (bg.get_rect().width -
+                                            rect_image.right) // 2, centery=bg.get_rect().centery)
+                bg.blit(image, rect_image.topleft)
+                bg.blit(label, rect_label.topleft)
+                rect = bg.get_rect()
             rect.bottomleft = self.get_rect().bottomleft
-            rect_image = image.get_rect(left=10, centery=rect.centery)
-            rect_label = label.get_rect(centerx=rect_image.right + (rect.width -
-                                        rect_image.right) // 2, centery=rect.centery)
-            self.surface.blit(bg, rect.topleft)
-            self.surface.blit(image, rect_image.topleft)
-            self.surface.blit(label, rect_label.topleft)
+            self._compositor.set_layer('printer', key, rect, bg, opaque=True)
+
+    def _render(self):
+        """Repaint the areas of the window which have changed. Return the
+        rectangle bounding them (None if nothing changed).
+        """
+        rects = self._compositor.render(self.surface)
+        if rects:
+            return rects[0].unionall(rects[1:])
+        return None
 
     def _center_pos(self, image):
         """
@@ -286,6 +391,7 @@ class PiWindow(object):
     def update(self):
         """Repaint the window with currently displayed images.
         """
+        self._compositor.invalidate()
         if self._current_background:
             self._update_background(self._current_background)
         else:
@@ -293,12 +399,35 @@ class PiWindow(object):
             self._update_print_number()
         if self._current_foreground:
             self._update_foreground(*self._current_foreground)
+        self._render()
+
+    def update_display(self, full=False):
+        """Push to the display the areas of the window which have changed
+        since the last call.
+
+        :param full: push the whole window (if something is painted on the
+                     surface without using this class)
+        :type full: bool
+        """
+        self._render()
+        self._compositor.flip(full)
+
+    def invalidate(self, rect=None):
+        """Force repainting an area of the window (all the window if None)
+        at next display update. To be used after painting directly on
+        the surface.
+
+        :param rect: area to repaint
+        :type rect: :py:class:`pygame.Rect`
+        """
+        self._compositor.invalidate(rect)
 
     def show_oops(self):
         """Show failure view in case of exception.
         """
         self._capture_number = (0, self._capture_number[1])
         self._update_background(background.OopsBackground())
+        self._render()
 
     def show_intro(self, pil_image=None, with_print=True):
         """Show introduction view.
@@ -320,8 +449,8 @@ class PiWindow(object):
                 self._update_foreground(pil_image, self.RIGHT)
 
         elif self._current_foreground:
-            self._buffered_images.pop(id(self._current_foreground[0]), None)
             self._current_foreground = None
+        self._render()
 
     def show_choice(self, choices, selected=None):
         """Show the choice view.
@@ -331,26 +460,27 @@ class PiWindow(object):
             self._update_background(background.ChooseBackground(choices, self.arrow_location, self.arrow_offset))
         else:
             self._update_background(background.ChosenBackground(choices, selected))
+        self._render()
 
     def show_image(self, pil_image=None, pos=CENTER):
-        """Show PIL image as it (no resize).
+        """Show PIL image (or pygame surface) as it (no resize).
         """
         if not pil_image:
             # Clear the currently displayed image
             if self._current_foreground:
-                _, image = self._buffered_images.pop(id(self._current_foreground[0]))
-                _, pos, _ = self._current_foreground
+                _, pos, resize = self._current_foreground
                 self._current_foreground = None
-                image.fill((0, 0, 0))
-                return self.surface.blit(image, self._pos_map[pos](image))
+                self._compositor.hide_layer(self._get_foreground_layer(pos, resize))
         else:
-            return self._update_foreground(pil_image, pos, False)
+            self._update_foreground(pil_image, pos, False)
+        return self._render()
 
     def show_work_in_progress(self):
         """Show wait view.
         """
         self._capture_number = (0, self._capture_number[1])
         self._update_background(background.ProcessingBackground())
+        self._render()
 
     def show_print(self, pil_image=None):
         """Show print view (image resized on the left).
@@ -361,6 +491,7 @@ class PiWindow(object):
                                                            self.orientation))
         if pil_image:
             self._update_foreground(pil_image, self.TOP_LEFT)
+        self._render()
 
     def show_finished(self, pil_image=None):
         """Show finished view (image resized fullscreen).
@@ -374,6 +505,7 @@ class PiWindow(object):
             self._update_foreground(pil_image, self.FULLSCREEN)
         else:
             self._update_background(background.FinishedBackground(orientation=self.orientation))
+        self._render()
 
     @contextlib.contextmanager
     def flash(self, count):
@@ -383,22 +515,17 @@ class PiWindow(object):
             raise ValueError("The flash counter shall be greater than 0")
 
         for i in range(count):
-            self.surface.fill((255, 255, 255))
-            if self._current_foreground:
-                # Flash only the background, keep foreground at the top
-                self._update_foreground(*self._current_foreground)
+            # Flash only the background, keep foreground at the top
+            self._compositor.set_layer('flash', True, self.get_rect(), opaque=True)
             pygame.event.pump()
-            pygame.display.update()
+            self.update_display()
             time.sleep(0.02)
             if i == count - 1:
                 yield  # Let's do actions before end of flash
-                self.update()
-                pygame.event.pump()
-                pygame.display.update()
-            else:
-                self.update()
-                pygame.event.pump()
-                pygame.display.update()
+            self._compositor.hide_layer('flash')
+            pygame.event.pump()
+            self.update_display()
+            if i != count - 1:
                 time.sleep(0.02)
 
     def set_capture_number(self, current_nbr, total_nbr):
@@ -411,13 +538,25 @@ class PiWindow(object):
         self._update_background(background.CaptureBackground(orientation=self.orientation))
         if self._current_foreground:
             self._update_foreground(*self._current_foreground)
-        pygame.display.update()
+        self.update_display()
 
-    def set_print_number(self, current_nbr=None, failure=None):
+    def set_print_number(self, current_nbr=None, failure=None, queues=None):
         """Set the current number of tasks in the printer queue.
+
+        :param current_nbr: number of tasks in the queues
+        :type current_nbr: int
+        :param failure: printing is not possible
+        :type failure: bool
+        :param queues: number of available printers and total number of
+                       printers (displayed if some are not available)
+        :type queues: tuple
         """
         update = False
 
+        if queues is not None and self._print_queues != tuple(queues):
+            self._print_queues = tuple(queues)
+            update = True
+
         if current_nbr is not None and self._print_number != current_nbr:
             self._print_number = current_nbr
             update = True
@@ -430,7 +569,7 @@ class PiWindow(object):
             self._update_background(self._current_background)
             if self._current_foreground:
                 self._update_foreground(*self._current_foreground)
-            pygame.display.update()
+            self.update_display()
 
     def toggle_fullscreen(self):
         """Set window to full screen or initial size.
@@ -455,3 +594,7 @@ class PiWindow(object):
         self._current_background = None
         self._current_foreground = None
         self._buffered_images = {}
+        self._surfaces.clear()
+        self._compositor.hide_layers_above('background')
+        self._compositor.hide_layer('background')
+        self._compositor.invalidate()
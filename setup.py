@@ -30,7 +30,6 @@ def main():
             'Intended Audience :: End Users/Desktop',
             'License :: OSI Approved :: MIT License',
             'Operating System :: POSIX :: Linux',
-            'Programming Language :: Python :: 3.6',
             'Programming Language :: Python :: 3.7',
             'Programming Language :: Python :: 3.8',
             'Programming Language :: Python :: 3.9',
@@ -64,11 +63,11 @@ def main():
             'pibooth.pictures': ['*/*.png'],
         },
         include_package_data=True,
-        python_requires=">=3.6",
+        python_requires=">=3.7",
         install_requires=[
             'picamera>=1.13 ; platform_machine>="armv0l" and platform_machine<="armv9l"',
             'Pillow==9.2.0',
-            'pygame>=1.9.6',
+            'pygame>=2.0.1',
             'pygame-menu==4.0.7',
             'pygame-vkeyboard>=2.0.8',
             'psutil>=5.5.1',
@@ -88,7 +87,8 @@ def main():
                                           "pibooth-diag = pibooth.scripts.diagnostic:main",
                                           "pibooth-fonts = pibooth.scripts.fonts:main",
                                           "pibooth-regen = pibooth.scripts.regenerate:main",
-                                          "pibooth-printcfg = pibooth.scripts.printer:main"]},
+                                          "pibooth-printcfg = pibooth.scripts.printer:main",
+                                          "pibooth-profile = pibooth.scripts.profile:main"]},
     )
 
 
@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
 import pytest
 
 
@@ -32,3 +33,12 @@ def test_hybridr_capture(camera_rpi_gp):
 def test_hybridc_capture(camera_cv_gp):
     camera_cv_gp.capture()
     assert camera_cv_gp.get_captures()
+
+
+def test_probe_cameras_timeout(monkeypatch):
+    from pibooth import camera
+    monkeypatch.setitem(camera.PROXIES, 'rpi', lambda: time.sleep(0.5))
+    monkeypatch.setitem(camera.PROXIES, 'opencv', lambda: None)
+    start = time.time()
+    assert camera.probe_cameras(['rpi', 'opencv'], timeout=0.1) == {}
+    assert time.time() - start < 0.4  # Probed in parallel, slow one abandoned
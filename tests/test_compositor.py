@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+import pygame
+from pibooth.view.compositor import Compositor
+
+
+def get_compositor(painted):
+    compositor = Compositor()
+    compositor.add_layer('background', lambda surface: painted.append('background'))
+    compositor.set_layer('background', 'bg', (0, 0, 100, 100), opaque=True)
+    return compositor
+
+
+def test_render_only_changes():
+    painted = []
+    surface = pygame.Surface((100, 100))
+    compositor = get_compositor(painted)
+    assert compositor.render(surface) == [pygame.Rect(0, 0, 100, 100)]
+    assert painted == ['background']
+
+    compositor.set_layer('background', 'bg', (0, 0, 100, 100), opaque=True)
+    assert compositor.render(surface) == []
+    assert painted == ['background']
+
+
+def test_render_opaque_layer():
+    painted = []
+    surface = pygame.Surface((100, 100))
+    compositor = get_compositor(painted)
+    compositor.render(surface)
+
+    image = pygame.Surface((10, 10))
+    image.fill((255, 0, 0))
+    compositor.set_layer('image', 1, (10, 10, 10, 10), image, opaque=True)
+    assert compositor.render(surface) == [pygame.Rect(10, 10, 10, 10)]
+    assert painted == ['background']  # Hidden by the opaque image
+    assert surface.get_at((15, 15)) == (255, 0, 0)
+
+    compositor.set_layer('image', 2, (15, 15, 10, 10), image, opaque=True)
+    assert compositor.render(surface) == [pygame.Rect(10, 10, 15, 15)]  # Merged
+    assert painted == ['background'] * 2
+
+    compositor.hide_layers_above('background')
+    assert compositor.render(surface) == [pygame.Rect(15, 15, 10, 10)]
+    assert painted == ['background'] * 3
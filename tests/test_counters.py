@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import pickle
 import pytest
+from pibooth.counters import Counters
 
 
 def test_iter(counters):
@@ -44,3 +46,28 @@ def test_save(counters):
     counters.reset()
     counters.load()
     assert counters.nbr_printed == 0
+
+
+def test_setdefault(counters):
+    counters.setdefault('printed_a', 0)
+    counters.printed_a = 3
+    counters.setdefault('printed_a', 0)
+    assert counters.printed_a == 3
+    counters.reset()
+    assert counters.printed_a == 0
+
+
+def test_flush_coalesced(counters):
+    counters.nbr_printed += 1
+    counters.nbr_printed += 1
+    assert [event[1:] for event in counters.get_history('nbr_printed')] == [('nbr_printed', 1),
+                                                                          ('nbr_printed', 2)]
+    reloaded = Counters(counters.filename, nbr_printed=0)
+    assert reloaded.nbr_printed == 2
+
+
+def test_import_legacy(tmpdir):
+    with open(str(tmpdir.join('data.pickle')), 'wb') as fp:
+        pickle.dump({'nbr_printed': 7}, fp)
+    counters = Counters(str(tmpdir.join('data.db')), nbr_printed=0)
+    assert counters.nbr_printed == 7
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+import io
+import pytest
+from PIL import Image, ImageOps
+from pibooth.pictures import exif
+
+
+def get_jpeg(orientation=None):
+    image = Image.new('RGB', (80, 60), (255, 0, 0))
+    image.paste((0, 0, 255), (0, 0, 20, 20))
+    buff = io.BytesIO()
+    if orientation:
+        tags = Image.Exif()
+        tags[exif.ORIENTATION_TAG] = orientation
+        tags[0x010F] = 'pibooth'  # Make
+        image.save(buff, 'JPEG', exif=tags.tobytes())
+    else:
+        image.save(buff, 'JPEG')
+    return buff.getvalue()
+
+
+def get_scan(data):
+    return data[data.index(b'\xff\xda'):]
+
+
+@pytest.mark.parametrize('orientation', [None, 1, 3])
+def test_set_orientation(orientation):
+    data = get_jpeg(orientation)
+    result = exif.set_orientation(data, exif.get_orientation(90))
+    assert get_scan(result) == get_scan(data)  # Image data untouched
+
+    image = Image.open(io.BytesIO(result))
+    assert image.getexif()[exif.ORIENTATION_TAG] == 8
+    assert ImageOps.exif_transpose(image).size == (60, 80)
+    if orientation:
+        assert len(result) == len(data)  # Patched in place
+        assert image.getexif()[0x010F] == 'pibooth'
+
+
+def test_set_orientation_invalid():
+    with pytest.raises(ValueError):
+        exif.set_orientation(b'not a jpeg', 1)
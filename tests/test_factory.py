@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 
 import pytest
+from PIL import Image
 from pibooth.pictures.factory import PilPictureFactory, OpenCvPictureFactory
+from pibooth.pictures.pool import PicturesFactoryPool
 
 footer_texts = ('This is the main title', 'Footer text 2', 'Footer text 3')
 footer_fonts = ('Amatic-Bold', 'DancingScript-Regular', 'Roboto-LightItalic')
@@ -79,3 +81,46 @@ def test_save_cv2_overlay_landscape(captures_nbr, captures_landscape, fond_path,
     setup_factory(factory, fond_path, overlays_landscape_path[captures_nbr - 1])
     path = tmpdir.join("OpenCV-landscape-overlay-{}.jpg".format(captures_nbr))
     factory.save(str(path))
+
+
+def test_template_cached(captures_portrait, fond_path):
+    factory1 = PilPictureFactory(2400, 3600, *captures_portrait[:2])
+    setup_factory(factory1, fond_path)
+    factory2 = PilPictureFactory(2400, 3600, *captures_portrait[1:3])
+    setup_factory(factory2, fond_path)
+    assert factory1._get_template(factory1.MATRIX) is factory2._get_template(factory2.MATRIX)
+
+    factory2.add_text('New text', footer_fonts[0], footer_colors[0])
+    template = factory2._get_template(factory2.MATRIX)
+    assert template is factory1._get_template(factory1.MATRIX)  # Only texts are rendered again
+    assert len(template.texts) == len(footer_texts)
+
+    factory2.set_margin(50)
+    assert factory1._get_template(factory1.MATRIX) is not factory2._get_template(factory2.MATRIX)
+
+
+@pytest.mark.parametrize('factory_class', [PilPictureFactory, OpenCvPictureFactory])
+def test_build_draft(tmpdir, factory_class):
+    path = str(tmpdir.join('capture.jpg'))
+    Image.new('RGB', (2400, 1600), (0, 0, 255)).save(path)
+    image = Image.open(path)
+    factory = factory_class(800, 1200, image, Image.open(path))
+    width, _ = factory.get_slot_size()
+    factory.build()
+    # Decoded with DCT scaling but still bigger than the slot
+    assert width <= image.size[0] < 2400
+
+
+def test_pool_bad_background(captures_portrait, tmpdir):
+    background = tmpdir.join('corrupted.jpg')
+    background.write('not an image')
+    factory = PilPictureFactory(600, 900, *captures_portrait[:1])
+    setup_factory(factory, str(background))
+    pool = PicturesFactoryPool()
+    try:
+        pool.start([factory])
+        pool.add(factory)
+        with pytest.raises(Exception):
+            pool.get(timeout=30)
+    finally:
+        pool.quit()
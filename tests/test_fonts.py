@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+from pibooth import fonts
+
+
+def test_pil_font_fit():
+    font = fonts.get_pil_font("Footer text", fonts.CURRENT, 400, 100)
+    smaller = fonts.get_pil_font("Footer text", fonts.CURRENT, 200, 100)
+    assert smaller.size < font.size
+
+
+def test_pil_font_cached():
+    font = fonts.get_pil_font("Smile", fonts.CURRENT, 300, 300)
+    assert fonts.get_pil_font("Smile", fonts.CURRENT, 300, 300) is font
+    fonts.drop_cache()
+    assert fonts.get_pil_font("Smile", fonts.CURRENT, 300, 300) is not font
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+import os
+import pygame
+from PIL import Image, ImageOps, ImageChops
+from pibooth import pictures
+
+
+def test_colorize_pil_image():
+    image = Image.open(pictures.get_filename('printer.png')).convert('RGBA')
+    expected = ImageOps.colorize(image.convert('L'), black=(0, 40, 90), white=(200, 30, 10))
+    expected.putalpha(image.getchannel('A'))
+    result = pictures.colorize_pil_image(image, (200, 30, 10), (0, 40, 90))
+    assert result.mode == 'RGBA'
+    assert ImageChops.difference(result, expected).getbbox() is None
+
+
+def test_get_pygame_image_cache(tmpdir, monkeypatch):
+    monkeypatch.setattr(pictures, 'CACHE_DIR', str(tmpdir))
+    pictures._get_raster.cache_clear()
+    image = pictures.get_pygame_image('printer.png', (50, 50), color=(255, 0, 0))
+    assert len(os.listdir(str(tmpdir))) == 1
+
+    image.fill((0, 0, 0))  # Cached data shall not be modified
+    pictures._get_raster.cache_clear()
+    cached = pictures.get_pygame_image('printer.png', (50, 50), color=(255, 0, 0))
+    assert cached.get_size() == image.get_size()
+    assert pygame.image.tostring(cached, 'RGBA') != pygame.image.tostring(image, 'RGBA')
+
+    pictures.get_pygame_image('printer.png', (50, 50), color=(0, 255, 0))
+    assert len(os.listdir(str(tmpdir))) == 2
+    pictures._get_raster.cache_clear()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+import time
+import types
+import pibooth
+from pibooth.plugins import create_plugin_manager
+
+
+def get_slow_plugin(duration):
+    plugin = types.ModuleType('slow_plugin')
+
+    @pibooth.hookimpl
+    def state_wait_do(cfg, app, win, events):
+        time.sleep(duration)
+
+    plugin.state_wait_do = state_wait_do
+    return plugin
+
+
+def test_hook_budget_warning(caplog):
+    pm = create_plugin_manager()
+    plugin = get_slow_plugin(0.02)
+    pm.register(plugin)
+    pm.set_hook_budget(0.01)
+    for _ in range(5):
+        pm.hook.state_wait_do(cfg=None, app=None, win=None, events=[])
+
+    assert pm.is_registered(plugin)
+    hook_name, stats = pm.get_hook_stats(plugin)[0]
+    assert hook_name == 'state_wait_do'
+    assert len(stats.durations) == 5
+    assert stats.over_budget == 5
+    assert stats.mean >= 0.02
+    assert "exceeded its budget" in caplog.text
+
+
+def test_hook_budget_disable():
+    pm = create_plugin_manager()
+    plugin = get_slow_plugin(0.02)
+    pm.register(plugin)
+    pm.set_hook_budget(0.01, disable=True)
+    for _ in range(5):
+        pm.hook.state_wait_do(cfg=None, app=None, win=None, events=[])
+
+    assert not pm.is_registered(plugin)
+    assert len(pm.get_hook_stats(plugin)[0][1].durations) == 3
+
+
+
+def test_hook_budget_core_plugin(caplog):
+    class CorePlugin(object):
+
+        @pibooth.hookimpl
+        def state_wait_do(self, cfg, app, win, events):
+            time.sleep(0.02)
+
+    pm = create_plugin_manager()
+    pm.register(CorePlugin(), name='pibooth-core:slow')
+    pm.set_hook_budget(0.01, disable=True)
+    for _ in range(5):
+        pm.hook.state_wait_do(cfg=None, app=None, win=None, events=[])
+    assert pm.get_plugin('pibooth-core:slow')
+    assert "exceeded its budget" not in caplog.text
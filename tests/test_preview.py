@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+import time
+import pytest
+from pibooth.camera.preview import PreviewPipeline
+
+
+def test_pipeline_latest_frame():
+    count = [0]
+
+    def grab():
+        time.sleep(0.005)
+        count[0] += 1
+        return count[0]
+
+    pipeline = PreviewPipeline(grab, lambda data: data * 10)
+    pipeline.start()
+    first = pipeline.get_frame(1)
+    time.sleep(0.1)  # Frames are produced without consumer
+    second = pipeline.get_frame(1)
+    pipeline.stop()
+    assert first % 10 == 0 and second > first + 10
+    assert pipeline.dropped > 0
+    assert pipeline.displayed == 2
+    assert pipeline.captured >= second // 10
+
+
+def test_pipeline_error():
+    def grab():
+        raise IOError("No preview")
+
+    pipeline = PreviewPipeline(grab, lambda data: data)
+    pipeline.start()
+    with pytest.raises(IOError):
+        pipeline.get_frame(1)
+    assert not pipeline.is_running()
+    pipeline.stop()
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from pibooth.printer import parse_media, parse_resolution
+
+
+@pytest.mark.parametrize('value, expected', [((300, 300, 3), 300),
+                                             ((118, 118, 4), 300),
+                                             ('300dpi', 300),
+                                             ('300x600dpi', 300),
+                                             ('Normal', None),
+                                             (None, None)])
+def test_parse_resolution(value, expected):
+    assert parse_resolution(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', [('na_index-4x6_4x6in', (4, 6)),
+                                             ('iso_a6_105x148mm', (105 / 25.4, 148 / 25.4)),
+                                             ('Postcard', None),
+                                             (None, None)])
+def test_parse_media(value, expected):
+    assert parse_media(value) == expected
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from pibooth.profiler import Histogram, Profiler, parse_log, PROFILE_TAG
+
+
+def test_histogram_percentile():
+    histogram = Histogram()
+    for _ in range(90):
+        histogram.add(0.0015)
+    for _ in range(10):
+        histogram.add(0.3)
+    assert histogram.count == 100
+    assert histogram.percentile(50) == 0.002
+    assert histogram.percentile(95) == 0.3  # Bucket bound greater than max
+    assert histogram.max == 0.3
+
+
+def test_profiler_log(caplog):
+    profiler = Profiler()
+    function = profiler.wrap(lambda value: value * 2, 'state_wait_do', 'pibooth-core:view')
+    assert function(2) == 4
+    profiler.start()
+    profiler.stop('hook', 'state_wait_do')
+
+    with caplog.at_level(logging.DEBUG, logger='pibooth'):
+        profiler.log()
+        profiler.log()  # Nothing new to log
+    lines = [record.getMessage() for record in caplog.records if PROFILE_TAG in record.getMessage()]
+    assert len(lines) == 2
+
+    histograms = parse_log(lines + lines)
+    assert histograms[('plugin', 'state_wait_do', 'pibooth-core:view')].count == 2
+    assert histograms[('hook', 'state_wait_do', None)].count == 2
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+from PIL import Image
+from pibooth.pictures.saver import PicturesSaver
+
+
+def test_save_multi_destinations(tmpdir):
+    saver = PicturesSaver()
+    image = Image.new('RGB', (80, 60), (255, 0, 0))
+    paths = [str(tmpdir.join('dir1', 'pic.jpg')), str(tmpdir.join('dir2', 'sub', 'pic.jpg'))]
+    saver.save(image, paths)
+    saver.quit()
+    with open(paths[0], 'rb') as fp1, open(paths[1], 'rb') as fp2:
+        assert fp1.read() == fp2.read()
+    assert Image.open(paths[0]).size == (80, 60)
+
+
+def test_save_raw_data(tmpdir):
+    saver = PicturesSaver()
+    image = Image.new('RGB', (80, 60))
+    image.raw_data = b'camera bytes'
+    path = str(tmpdir.join('pic.jpg'))
+    saver.save(image, [path])
+    saver.wait()
+    with open(path, 'rb') as fp:
+        assert fp.read() == b'camera bytes'
+    saver.quit()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+import time
+import pytest
+import pygame
+from pibooth.utils import PoolingTimer
+from pibooth.scheduler import FrameScheduler
+
+
+@pytest.fixture(scope='module', autouse=True)
+def display():
+    pygame.display.init()
+
+
+def test_next_timeout():
+    timer = PoolingTimer(0.05)
+    paused = PoolingTimer(0.01)
+    paused.freeze()
+    assert 0.04 < PoolingTimer.next_timeout() <= 0.05
+    timer.reset()
+
+
+def test_idle_sleep_until_timer():
+    scheduler = FrameScheduler(fps=40, max_sleep=1)
+    pygame.event.clear()
+    timer = PoolingTimer(0.2)
+    start = time.time()
+    scheduler.tick('wait')
+    assert 0.15 < time.time() - start < 0.5
+    assert scheduler.stats['wait'].frames == 1
+    timer.reset()
+
+
+def test_idle_wake_up_on_event():
+    scheduler = FrameScheduler(fps=40, max_sleep=2)
+    pygame.event.clear()
+    pygame.event.post(pygame.event.Event(pygame.USEREVENT))
+    start = time.time()
+    scheduler.tick('wait')
+    assert time.time() - start < 0.5
+    assert [event.type for event in scheduler.get_events()] == [pygame.USEREVENT]
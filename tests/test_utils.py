@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from pibooth.utils import LazyModule
+
+
+def test_lazy_module():
+    json = LazyModule('json')
+    assert json
+    assert json.loads('[1]') == [1]
+
+
+def test_lazy_module_not_installed():
+    module = LazyModule('pibooth_not_installed_module')
+    assert not module
+    with pytest.raises(ImportError):
+        module.function()
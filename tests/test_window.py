@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import os
+import weakref
 import pytest
 import pygame
 from pibooth.view.window import PiWindow
@@ -87,3 +88,22 @@ def test_finished_portrait(init, captures_portrait):
 
 def test_finished_landscape(init, captures_landscape):
     loop(WIN.show_finished, captures_landscape[0])
+
+
+def test_surfaces_cache(init, captures_landscape):
+    size = WIN.get_foreground_size()
+    WIN.show_intro(captures_landscape[0])
+    surface = WIN._get_surface(captures_landscape[0], size)
+    for image in captures_landscape[1:]:
+        WIN.show_intro(image)
+    assert WIN._get_surface(captures_landscape[0], size) is surface
+    assert len(WIN._surfaces) <= WIN.SURFACES_CACHE_SIZE
+
+
+def test_surfaces_cache_no_reference(init, captures_landscape):
+    image = captures_landscape[0].copy()
+    ref = weakref.ref(image)
+    WIN.show_intro(image)
+    WIN.show_intro(captures_landscape[1])
+    del image
+    assert ref() is None